@@ -1,23 +1,34 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 import asyncio
 import json
 import os
+import threading
 from datetime import datetime
 from dotenv import load_dotenv
 from genai_mediaplan.schedulers.scheduler import scheduler
-from genai_mediaplan.crew import GenaiMediaplan
+from genai_mediaplan.schedulers.refresh_engine import refresh_all_cohorts
+from genai_mediaplan.jobs.job_store import get_job_store, QUEUED, COMPLETED, FAILED
+from genai_mediaplan.jobs.worker_pool import job_pool
+from genai_mediaplan.jobs.mediaplan_jobs import GENERATE_MEDIAPLAN
+from genai_mediaplan.crew import kickoff_mediaplan_crew
 from genai_mediaplan.utils.forecast_data_api_based import export_table_as_json
-from genai_mediaplan.utils.helper import extract_json_from_markdown_or_json
-from genai_mediaplan.utils.update_google_slides_content import get_copy_of_presentation
+from genai_mediaplan.utils.cohort_catalog import cohort_catalog
+from genai_mediaplan.utils.blocking_executor import ExecutorSaturatedError, generation_executor, io_executor, GENERATION_MAX_CONCURRENCY
+from genai_mediaplan.utils.update_google_slides_content import get_copy_of_presentation, template_pool
 from genai_mediaplan.utils.update_forecast_data_in_slides import update_forecast_data_for_cohort
+from genai_mediaplan.utils.batch_generation import generate_mediaplans, BATCH_MAX_WORKERS
 from genai_mediaplan.utils.logger import get_logger
 
 # Load environment variables
 load_dotenv(override=True)
 
+# How often /task-events checks the job store for new events, and sends a keep-alive comment
+TASK_EVENTS_POLL_SECONDS = float(os.getenv("TASK_EVENTS_POLL_SECONDS", "1"))
+TASK_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("TASK_EVENTS_KEEPALIVE_SECONDS", "15"))
+
 # Set up logging
 logger = get_logger(__name__)
 
@@ -27,11 +38,30 @@ app = FastAPI(
     version="1.0.0"
 )
 
+class ClosingStreamingResponse(StreamingResponse):
+    """StreamingResponse that calls on_close once the response ends, including on client disconnect"""
+
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
+
 # Pydantic models for request/response
 class CohortRequest(BaseModel):
     cohort_name: str
     audience_data: Optional[Dict[str, Any]] = None
     forecast_data: Optional[Dict[str, Any]] = None
+    # False calls every model again instead of replaying stored agent outputs
+    use_llm_cache: bool = True
+
+class BatchCohortRequest(BaseModel):
+    cohort_names: List[str]
+    max_workers: Optional[int] = Field(default=None, ge=1)
 
 class UpdatePresentationRequest(BaseModel):
     cohort_name: str
@@ -57,8 +87,14 @@ class HealthResponse(BaseModel):
     status: str
     timestamp: str
 
-# Global variable to store task status
-task_status = {}
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request, exc: ExecutorSaturatedError):
+    """Shed load instead of queueing blocking work without limit"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after_seconds)}
+    )
 
 # Startup event to start the scheduler
 @app.on_event("startup")
@@ -66,11 +102,43 @@ async def start_scheduler():
     """Start the scheduler when the FastAPI app starts"""
     scheduler.start()
 
+# Startup event to start the job workers
+@app.on_event("startup")
+async def start_job_pool():
+    """Start the background job workers, unless JOB_WORKERS=0 leaves them to a separate worker process"""
+    if job_pool.max_workers > 0:
+        job_pool.start()
+
+# Startup event to keep pre-made template copies ready
+@app.on_event("startup")
+async def start_template_pool():
+    """Start refilling the template pool in the background (disabled with TEMPLATE_POOL_SIZE=0)"""
+    template_pool.start()
+
 # Shutdown event to stop the scheduler
 @app.on_event("shutdown")
 async def stop_scheduler():
     """Stop the scheduler when the FastAPI app shuts down"""
     scheduler.stop()
+
+# Shutdown event to stop the job workers
+@app.on_event("shutdown")
+async def stop_job_pool():
+    """Stop claiming jobs; unfinished ones are requeued after their heartbeat goes stale"""
+    job_pool.stop()
+
+# Shutdown event to stop the template pool
+@app.on_event("shutdown")
+async def stop_template_pool():
+    """Stop refilling; ready copies stay in the folder for the next process"""
+    template_pool.stop()
+
+# Shutdown event to stop the blocking-work executors
+@app.on_event("shutdown")
+async def stop_executors():
+    """Drop queued blocking calls; running ones finish in their threads"""
+    generation_executor.shutdown()
+    io_executor.shutdown()
     
 @app.get("/", response_model=HealthResponse)
 async def root():
@@ -97,37 +165,11 @@ async def generate_mediaplan(request: CohortRequest):
     1. Run the CrewAI agents to generate insights
     2. Create a Google Slides presentation
     3. Return the presentation URL
+    
+    Returns 503 with Retry-After when the generation executor is full.
     """
     try:
-        # Use provided data or fetch from database
-        if request.audience_data and request.forecast_data:
-            audience_data = request.audience_data
-            forecast_data = request.forecast_data
-        else:
-            # Fetch data from database
-            data = export_table_as_json(request.cohort_name)
-            audience_data = data['abvr']
-            forecast_data = data['results']
-        
-        # Prepare inputs for CrewAI
-        inputs = {
-            'cohort_name': request.cohort_name,
-            'audience_data': audience_data
-        }
-        
-        # Run CrewAI
-        crew = GenaiMediaplan().crew()
-        result = crew.kickoff(inputs=inputs)
-        
-        # Extract JSON from the generated report
-        model_output_json = extract_json_from_markdown_or_json("final_report.md")
-        
-        # Create Google Slides presentation
-        google_slides_url = get_copy_of_presentation(
-            request.cohort_name, 
-            model_output_json, 
-            forecast_data
-        )
+        google_slides_url = await generation_executor.run(generate_mediaplan_for_request, request)
         
         return CohortResponse(
             status="success",
@@ -136,12 +178,84 @@ async def generate_mediaplan(request: CohortRequest):
             google_slides_url=google_slides_url
         )
         
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error generating mediaplan: {str(e)}"
         )
 
+def generate_mediaplan_for_request(request: CohortRequest):
+    """Blocking part of /generate-mediaplan, run on the generation executor"""
+    # Use provided data or fetch from database
+    if request.audience_data and request.forecast_data:
+        audience_data = request.audience_data
+        forecast_data = request.forecast_data
+    else:
+        # Fetch data from database
+        data = export_table_as_json(request.cohort_name)
+        audience_data = data['abvr']
+        forecast_data = data['results']
+    
+    # Prepare inputs for CrewAI
+    inputs = {
+        'cohort_name': request.cohort_name,
+        'audience_data': audience_data
+    }
+    
+    # Run CrewAI
+    model_output_json = kickoff_mediaplan_crew(inputs, use_llm_cache=request.use_llm_cache)
+    
+    # Create Google Slides presentation
+    return get_copy_of_presentation(
+        request.cohort_name, 
+        model_output_json, 
+        forecast_data
+    )
+
+@app.post("/generate-mediaplan-batch")
+async def generate_mediaplan_batch(request: BatchCohortRequest):
+    """
+    Generate mediaplans for many cohorts in one call.
+    
+    Cohorts run `max_workers` at a time and share one catalog load and one read of the
+    template deck. The response is newline-delimited JSON: one line per cohort as it
+    finishes, then a summary line.
+    
+    Returns 503 with Retry-After when the generation executor is full.
+    """
+    if not request.cohort_names:
+        raise HTTPException(status_code=400, detail="cohort_names must not be empty")
+    # One generation slot per cohort running at a time, never more than the executor allows
+    max_workers = min(request.max_workers or BATCH_MAX_WORKERS, GENERATION_MAX_CONCURRENCY, len(set(request.cohort_names)))
+    release = generation_executor.reserve(max_workers)
+    state = {"started": False, "released": False}
+    state_lock = threading.Lock()
+    
+    def release_once():
+        with state_lock:
+            if state["released"]:
+                return
+            state["released"] = True
+        release()
+    
+    def stream_results():
+        state["started"] = True
+        try:
+            for result in generate_mediaplans(request.cohort_names, max_workers=max_workers):
+                yield json.dumps(result) + "\n"
+        finally:
+            # Runs once the cohorts already started have finished, even after a disconnect
+            release_once()
+    
+    def on_response_close():
+        # A client that disconnects before the first chunk never starts the generator
+        if not state["started"]:
+            release_once()
+    
+    return ClosingStreamingResponse(stream_results(), media_type="application/x-ndjson", on_close=on_response_close)
+
 @app.post("/update-numerical-data-in-presentation", response_model=UpdatePresentationResponse)
 async def update_numerical_data_in_presentation(request: UpdatePresentationRequest):
     """
@@ -153,12 +267,7 @@ async def update_numerical_data_in_presentation(request: UpdatePresentationReque
     """
     logger.info(f"Updating numerical data in presentation for {request.cohort_name}")
     try:
-        if request.forecast_data:
-            forecast_data = request.forecast_data
-        else:
-            data = export_table_as_json(request.cohort_name)
-            forecast_data = data['results']
-        update_forecast_data_for_cohort(forecast_data, request.presentation_id)
+        await generation_executor.run(update_numerical_data_for_request, request)
         
         google_slides_url = f"https://drive.google.com/file/d/{request.presentation_id}"
         
@@ -170,47 +279,44 @@ async def update_numerical_data_in_presentation(request: UpdatePresentationReque
             google_slides_url=google_slides_url
         )
         
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error updating presentation: {str(e)}"
         )
+
+def update_numerical_data_for_request(request: UpdatePresentationRequest):
+    """Blocking part of /update-numerical-data-in-presentation, run on the generation executor"""
+    if request.forecast_data:
+        forecast_data = request.forecast_data
+    else:
+        data = export_table_as_json(request.cohort_name)
+        forecast_data = data['results']
+    update_forecast_data_for_cohort(forecast_data, request.presentation_id)
         
 @app.get("/refresh-all-cohort-data")
-async def refresh_all_cohort_data():
+async def refresh_all_cohort_data(max_workers: Optional[int] = None, force: bool = False):
     """
     Refresh data for all cohorts.
     
     This endpoint will:
     1. Fetch all cohorts from the database
-    2. Update their presentations with the latest forecast data
+    2. Update their presentations with the latest forecast data, `max_workers` cohorts at a time,
+       skipping cohorts whose forecast has not changed unless `force` is set
+    3. Return a per-cohort summary with status, attempts and timings
     """
     try:
-        with open('mediaplan_responses.json', 'r') as f:
-            data = json.loads(f.read())
-        logger.info(f"Starting to refresh all cohort data... Found {len(data)} cohorts")
-        for cohort_name in data.keys():
-            logger.info(f"Processing cohort: {cohort_name}")
-            try:
-                presentation_id = data[cohort_name].get('google_slides_url', '').replace("https://docs.google.com/presentation/d/", "")
-                if not presentation_id:
-                    logger.warning(f"No presentation ID found for cohort {cohort_name}, skipping")
-                    continue
-                data_to_update = export_table_as_json(cohort_name)
-                forecast_data = data_to_update['results']
-                logger.info(f"Updating data for {cohort_name} with presentation ID {presentation_id}")
-                logger.debug(f"Found {len(forecast_data.keys())} forecast data keys for {cohort_name}")
-                update_forecast_data_for_cohort(forecast_data, presentation_id)
-                logger.info(f"Successfully updated data for {cohort_name}")
-            except Exception as e:
-                logger.error(f"Failed to update data for {cohort_name}: {str(e)}")
-                continue
+        summary = await generation_executor.run(refresh_all_cohorts, max_workers=max_workers, force=force)
         logger.info("Successfully refreshed all cohort data.")
         return JSONResponse(
             status_code=200,
-            content={"message": "Cohort data refreshed successfully"}
+            content={"message": "Cohort data refreshed successfully", "summary": summary}
         )
     
+    except ExecutorSaturatedError:
+        raise
     except Exception as e:
         logger.error(f"Failed to refresh cohort data: {str(e)}")
         raise HTTPException(
@@ -219,39 +325,30 @@ async def refresh_all_cohort_data():
         )
 
 @app.post("/generate-mediaplan-async")
-async def generate_mediaplan_async(request: CohortRequest, background_tasks: BackgroundTasks):
+async def generate_mediaplan_async(request: CohortRequest):
     """
     Generate a mediaplan asynchronously.
     
-    This endpoint starts the generation process in the background
+    This endpoint queues the generation in the job store, where a worker picks it up,
     and returns a task ID that can be used to check status.
     """
-    task_id = f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{request.cohort_name}"
-    
-    # Initialize task status
-    task_status[task_id] = {
-        "status": "running",
-        "progress": 0,
-        "message": "Starting mediaplan generation...",
-        "cohort_name": request.cohort_name,
-        "created_at": datetime.now().isoformat(),
-        "google_slides_url": None,
-        "error": None
-    }
-    
-    # Add background task
-    background_tasks.add_task(
-        run_mediaplan_generation,
-        task_id,
-        request.cohort_name,
-        request.audience_data,
-        request.forecast_data
+    task_id = await io_executor.run(
+        get_job_store().create,
+        GENERATE_MEDIAPLAN,
+        {
+            "cohort_name": request.cohort_name,
+            "audience_data": request.audience_data,
+            "forecast_data": request.forecast_data,
+            "use_llm_cache": request.use_llm_cache
+        },
+        cohort_name=request.cohort_name
     )
+    job_pool.notify()
     
     return {
         "task_id": task_id,
-        "status": "started",
-        "message": "Mediaplan generation started in background"
+        "status": QUEUED,
+        "message": "Mediaplan generation queued"
     }
 
 @app.get("/task-status/{task_id}")
@@ -259,26 +356,71 @@ async def get_task_status(task_id: str):
     """
     Get the status of a background task.
     """
-    if task_id not in task_status:
+    status = await io_executor.run(get_job_store().get, task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    return status
+
+@app.get("/task-events/{task_id}")
+async def stream_task_events(task_id: str, last_event_id: Optional[int] = Header(default=None)):
+    """
+    Server-sent events for a background task: queued, running, progress, crew_task
+    (one per finished crew task), slides_stage (one per Google Slides stage), then
+    completed or failed, after which the stream ends. Reconnecting clients resume
+    after their Last-Event-ID.
+    """
+    if await io_executor.run(get_job_store().get, task_id) is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return task_status[task_id]
+    async def event_stream():
+        after_event_id = last_event_id or 0
+        idle_seconds = 0.0
+        while True:
+            try:
+                events = await io_executor.run(get_job_store().events_since, task_id, after_event_id)
+            except ExecutorSaturatedError as e:
+                # The 200 is already sent, so back off and poll again instead of breaking the stream
+                logger.debug(f"Task events poll for {task_id} deferred: {e}")
+                events = []
+                await asyncio.sleep(e.retry_after_seconds)
+                idle_seconds += e.retry_after_seconds
+            for event in events:
+                after_event_id = event["id"]
+                data = json.dumps({**event["data"], "created_at": event["created_at"]})
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+                if event["type"] in (COMPLETED, FAILED):
+                    return
+            if events:
+                idle_seconds = 0.0
+            elif idle_seconds >= TASK_EVENTS_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                idle_seconds = 0.0
+            await asyncio.sleep(TASK_EVENTS_POLL_SECONDS)
+            idle_seconds += TASK_EVENTS_POLL_SECONDS
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/available-cohorts")
-async def get_available_cohorts():
+async def get_available_cohorts(refresh: bool = False):
     """
     Get list of available cohorts.
+    
+    Served from the cached cohort catalog; pass `refresh=true` to reload it from upstream.
     """
-    # This would typically query your database
-    # For now, returning a static list
-    cohorts = [
-        "Shopping",
-        "Education", 
-        "Travel",
-        "Finance",
-        "Healthcare",
-        "Technology"
-    ]
+    try:
+        if refresh:
+            cohort_catalog.invalidate()
+        cohorts = await io_executor.run(cohort_catalog.names)
+    except ExecutorSaturatedError:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting available cohorts: {e}")
+        raise HTTPException(status_code=502, detail=f"Error fetching cohort catalog: {str(e)}")
     
     return {
         "cohorts": cohorts,
@@ -294,74 +436,6 @@ async def get_scheduler_status():
         logger.error(f"Error getting scheduler status: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     
-async def run_mediaplan_generation(task_id: str, cohort_name: str, audience_data: Optional[Dict], forecast_data: Optional[Dict]):
-    """
-    Background task to run mediaplan generation.
-    """
-    try:
-        logger.info(f"Starting background mediaplan generation for task {task_id}, cohort: {cohort_name}")
-        
-        # Update status
-        task_status[task_id]["progress"] = 10
-        task_status[task_id]["message"] = "Fetching data..."
-        
-        # Use provided data or fetch from database
-        if audience_data and forecast_data:
-            audience_data = audience_data
-            forecast_data = forecast_data
-            logger.debug(f"Using provided data for cohort {cohort_name}")
-        else:
-            # Fetch data from database
-            logger.debug(f"Fetching data from database for cohort {cohort_name}")
-            data = export_table_as_json(cohort_name)
-            audience_data = data['abvr']
-            forecast_data = data['results']
-        
-        task_status[task_id]["progress"] = 20
-        task_status[task_id]["message"] = "Running CrewAI agents..."
-        logger.info(f"Running CrewAI agents for cohort {cohort_name}")
-        
-        # Prepare inputs for CrewAI
-        inputs = {
-            'cohort_name': cohort_name,
-            'audience_data': audience_data
-        }
-        
-        # Run CrewAI
-        crew = GenaiMediaplan().crew()
-        result = crew.kickoff(inputs=inputs)
-        
-        task_status[task_id]["progress"] = 80
-        task_status[task_id]["message"] = "Creating Google Slides presentation..."
-        logger.info(f"Creating Google Slides presentation for cohort {cohort_name}")
-        
-        # Extract JSON from the generated report
-        model_output_json = extract_json_from_markdown_or_json("final_report.md")
-        
-        # Create Google Slides presentation
-        google_slides_url = get_copy_of_presentation(
-            cohort_name, 
-            model_output_json, 
-            forecast_data
-        )
-        
-        # Update final status
-        task_status[task_id]["status"] = "completed"
-        task_status[task_id]["progress"] = 100
-        task_status[task_id]["message"] = "Mediaplan generated successfully"
-        task_status[task_id]["google_slides_url"] = google_slides_url
-        task_status[task_id]["completed_at"] = datetime.now().isoformat()
-        
-        logger.info(f"Successfully completed mediaplan generation for task {task_id}, cohort: {cohort_name}")
-        
-    except Exception as e:
-        logger.error(f"Error in background mediaplan generation for task {task_id}, cohort: {cohort_name}: {str(e)}")
-        # Update error status
-        task_status[task_id]["status"] = "failed"
-        task_status[task_id]["message"] = f"Error: {str(e)}"
-        task_status[task_id]["error"] = str(e)
-        task_status[task_id]["failed_at"] = datetime.now().isoformat()
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
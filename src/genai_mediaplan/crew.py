@@ -1,7 +1,28 @@
+import json
+import os
+import time
 from crewai import Agent, Crew, Process, Task
-from crewai.project import CrewBase, agent, crew, task
+from crewai.project import CrewBase, agent, crew, task, before_kickoff, after_kickoff
 from crewai.agents.agent_builder.base_agent import BaseAgent
 from typing import List
+from genai_mediaplan.utils.logger import get_logger
+from genai_mediaplan.utils.llm_cache import CachedAgent
+from genai_mediaplan.utils.helper import extract_json_from_text
+from genai_mediaplan.utils.mediaplan_assembler import assemble_mediaplan, enforce_limits, validate_mediaplan, problem_tasks
+from genai_mediaplan.mediaplan_schema import MediaplanOutput
+
+logger = get_logger(__name__)
+
+def parallel_tasks_enabled():
+    """
+    When true (the default), tasks with no upstream context in tasks.yaml run
+    concurrently and join before the first task that depends on them.
+    Set CREW_PARALLEL_TASKS=false to run every task one after another.
+    """
+    return os.getenv("CREW_PARALLEL_TASKS", "true").lower() == "true"
+
+# Optional copy of the final mediaplan on disk for debugging; the result itself is returned in memory
+CREW_OUTPUT_FILE = os.getenv("CREW_OUTPUT_FILE") or None
 # If you want to run a snippet of code before or after the crew starts,
 # you can use the @before_kickoff and @after_kickoff decorators
 # https://docs.crewai.com/concepts/crews#example-crew-class-with-decorators
@@ -12,6 +33,20 @@ class GenaiMediaplan():
 
     agents: List[BaseAgent]
     tasks: List[Task]
+    # Set to False before building the crew to skip stored agent outputs (see CachedAgent)
+    use_llm_cache = True
+
+    @before_kickoff
+    def start_timer(self, inputs):
+        self._kickoff_started_at = time.monotonic()
+        return inputs
+
+    @after_kickoff
+    def log_wall_time(self, result):
+        mode = "parallel" if parallel_tasks_enabled() else "sequential"
+        self.wall_time_seconds = round(time.monotonic() - self._kickoff_started_at, 2)
+        logger.info(f"Crew finished in {self.wall_time_seconds}s ({mode} task mode)")
+        return result
 
     # Learn more about YAML configuration files here:
     # Agents: https://docs.crewai.com/concepts/agents#yaml-configuration-recommended
@@ -21,49 +56,49 @@ class GenaiMediaplan():
     # https://docs.crewai.com/concepts/agents#agent-tools
     @agent
     def definition_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['definition_agent'],  # type: ignore[index]
             verbose=True
         )
         
     @agent
     def data_signals_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['data_signals_agent'],  # type: ignore[index]
             verbose=True
         )
         
     @agent
     def persona_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['persona_agent'],  # type: ignore[index]
             verbose=True
         )
         
     @agent
     def insight_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['insight_agent'],  # type: ignore[index]
             verbose=True
         )
 
     @agent
     def market_edge_synthesizer_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['market_edge_synthesizer_agent'], # type: ignore[index]
             verbose=True
         )
         
     @agent
     def recommendation_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['recommendation_agent'], # type: ignore[index]
             verbose=True
         )
 
     @agent
     def formatter_agent(self) -> Agent:
-        return Agent(
+        return CachedAgent(
             config=self.agents_config['formatter_agent'], # type: ignore[index]
             verbose=True
         )
@@ -71,16 +106,23 @@ class GenaiMediaplan():
     # To learn more about structured task outputs,
     # task dependencies, and task callbacks, check out the documentation:
     # https://docs.crewai.com/concepts/tasks#overview-of-a-task
+    # definition, data signals, persona and insight tasks only read the cohort inputs, so
+    # they can run concurrently. crew_base skips an empty `context:` from tasks.yaml, so the
+    # empty context is set here; without it a task receives every earlier task's output.
     @task
     def definition_task(self) -> Task:
         return Task(
             config=self.tasks_config['definition_task'], # type: ignore[index]
+            async_execution=parallel_tasks_enabled(),
+            context=[],
         )
 
     @task
     def data_signals_task(self) -> Task:
         return Task(
             config=self.tasks_config['data_signals_task'], # type: ignore[index]
+            async_execution=parallel_tasks_enabled(),
+            context=[],
             # output_file='report.md'
         )
 
@@ -88,6 +130,8 @@ class GenaiMediaplan():
     def persona_task(self) -> Task:
         return Task(
             config=self.tasks_config['persona_task'], # type: ignore[index]
+            async_execution=parallel_tasks_enabled(),
+            context=[],
             # output_file='report.md'
         )
 
@@ -95,6 +139,8 @@ class GenaiMediaplan():
     def insight_task(self) -> Task:
         return Task(
             config=self.tasks_config['insight_task'], # type: ignore[index]
+            async_execution=parallel_tasks_enabled(),
+            context=[],
             # output_file='report.md'
         )
         
@@ -116,7 +162,7 @@ class GenaiMediaplan():
     def formatting_task(self) -> Task:
         return Task(
             config=self.tasks_config['formatting_task'], # type: ignore[index]
-            output_file='final_report.md'
+            output_pydantic=MediaplanOutput
         )
 
     @crew
@@ -125,11 +171,73 @@ class GenaiMediaplan():
         # To learn how to add knowledge sources to your crew, check out the documentation:
         # https://docs.crewai.com/concepts/knowledge#what-is-knowledge
 
+        # The formatting task only runs to repair an assembled mediaplan that fails validation
         return Crew(
-            agents=self.agents, # Automatically created by the @agent decorator
-            tasks=self.tasks, # Automatically created by the @task decorator
+            agents=[agent for agent in self.agents if agent.role != self.formatter_agent().role],
+            tasks=[task for task in self.tasks if task.name != "formatting_task"],
+            # Async tasks are started in order and awaited before the next synchronous task
             process=Process.sequential,
             verbose=True,
             # process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
         )
 
+    def repair_mediaplan(self, inputs, task_outputs, problems):
+        """Ask the formatter agent to rebuild the mediaplan from the upstream outputs"""
+        formatting_task = self.formatting_task()
+        formatting_task.interpolate_inputs_and_add_conversation_history(inputs)
+        context = "\n\n".join(f"{name}:\n{raw}" for name, raw in task_outputs.items())
+        context += "\n\nThe assembled JSON had these problems, fix them:\n" + "\n".join(f"- {problem}" for problem in problems)
+        formatting_task.agent.use_output_cache = self.use_llm_cache
+        try:
+            output = formatting_task.execute_sync(context=context)
+            if isinstance(output.pydantic, MediaplanOutput):
+                mediaplan = output.pydantic.model_dump()
+            else:
+                mediaplan = extract_json_from_text(output.raw)
+                if not isinstance(mediaplan, dict):
+                    raise ValueError("Formatter output is not valid mediaplan JSON")
+            enforce_limits(mediaplan)
+            validated, remaining_problems = validate_mediaplan(mediaplan)
+            if validated is None:
+                raise ValueError(f"Formatter output is not a valid mediaplan: {remaining_problems}")
+        except Exception:
+            # A failed repair must not be replayed on the next run
+            formatting_task.agent.evict_cached_outputs([formatting_task.name])
+            raise
+        if remaining_problems:
+            logger.warning(f"Mediaplan still incomplete after repair: {remaining_problems}")
+        return validated
+
+
+def kickoff_mediaplan_crew(inputs, task_callback=None, use_llm_cache=True):
+    """
+    Run the crew for one cohort and return the validated mediaplan as a dict.
+    The upstream task outputs are merged locally; the formatter agent is only
+    called when that result fails validation. Nothing is shared on disk, so
+    several generations can run at once.
+
+    task_callback, if given, is called with each TaskOutput as its task finishes.
+    With use_llm_cache=False every agent calls its model instead of replaying a stored
+    output. Stored outputs of the tasks that fail assembly are evicted either way.
+    """
+    genai_mediaplan = GenaiMediaplan()
+    genai_mediaplan.use_llm_cache = use_llm_cache
+    crew = genai_mediaplan.crew()
+    for crew_agent in crew.agents:
+        crew_agent.use_output_cache = use_llm_cache
+    if task_callback:
+        crew.task_callback = task_callback
+    result = crew.kickoff(inputs=inputs)
+    task_outputs = {output.name: output.raw for output in result.tasks_output}
+    mediaplan, problems = assemble_mediaplan(task_outputs)
+    if problems:
+        logger.warning(f"Assembled mediaplan failed validation, asking the formatter to repair it: {problems}")
+        # Don't replay the outputs that failed on the next run; the valid ones stay cached
+        failed_tasks = problem_tasks(problems)
+        for crew_agent in crew.agents:
+            crew_agent.evict_cached_outputs(failed_tasks)
+        mediaplan = genai_mediaplan.repair_mediaplan(inputs, task_outputs, problems)
+    if CREW_OUTPUT_FILE:
+        with open(CREW_OUTPUT_FILE, 'w', encoding='utf-8') as f:
+            json.dump(mediaplan, f, indent=2, ensure_ascii=False)
+    return mediaplan
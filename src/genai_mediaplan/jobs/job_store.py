@@ -0,0 +1,328 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "jobs.sqlite3")
+# Finished jobs are kept this long so clients can still read their status
+JOB_RESULT_TTL_SECONDS = float(os.getenv("JOB_RESULT_TTL_SECONDS", str(7 * 24 * 3600)))
+# A running job whose worker has not sent a heartbeat for this long is considered abandoned
+JOB_STALE_AFTER_SECONDS = float(os.getenv("JOB_STALE_AFTER_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "2"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+class JobStore:
+    """
+    SQLite-backed job queue shared by every API and worker process on the host.
+    Claims run in an immediate transaction, so a job is only ever handed to one worker.
+    It also holds the template pool's pair claims and the leases of host-wide singletons.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT, cohort_name TEXT, payload TEXT, "
+                "status TEXT, progress INTEGER, message TEXT, result TEXT, error TEXT, "
+                "attempts INTEGER DEFAULT 0, worker_id TEXT, "
+                "created_at REAL, started_at REAL, heartbeat_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)")
+            # Stores created before artifacts were tracked
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "artifacts" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN artifacts TEXT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS job_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, type TEXT, data TEXT, created_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS job_events_job ON job_events (job_id, id)")
+            # Template pool pairs taken by a claim or a deletion, and single-holder leases
+            conn.execute("CREATE TABLE IF NOT EXISTS pool_claims (pair_id TEXT PRIMARY KEY, claimed_by TEXT, claimed_at REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, expires_at REAL)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call; autocommit so claims can open their own transaction
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _add_event(self, conn, job_id, event_type, data, now):
+        conn.execute(
+            "INSERT INTO job_events (job_id, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, event_type, json.dumps(data), now)
+        )
+
+    def add_event(self, job_id, event_type, data):
+        """Record a progress event for /task-events subscribers"""
+        with self._lock, self._connect() as conn:
+            self._add_event(conn, job_id, event_type, data, time.time())
+
+    def events_since(self, job_id, after_event_id=0):
+        """Events of a job newer than after_event_id, oldest first"""
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, type, data, created_at FROM job_events WHERE job_id = ? AND id > ? ORDER BY id",
+                (job_id, after_event_id)
+            ).fetchall()
+        return [
+            {"id": row["id"], "type": row["type"], "data": json.loads(row["data"]), "created_at": _isoformat(row["created_at"])}
+            for row in rows
+        ]
+
+    def create(self, kind, payload, cohort_name=None):
+        """Queue a job and return its id"""
+        now = time.time()
+        job_id = f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{cohort_name}_{uuid.uuid4().hex[:8]}"
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, cohort_name, payload, status, progress, message, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 0, ?, ?)",
+                (job_id, kind, cohort_name, json.dumps(payload), QUEUED, "Queued", now)
+            )
+            self._add_event(conn, job_id, QUEUED, {"progress": 0, "message": "Queued"}, now)
+        return job_id
+
+    def claim(self, worker_id):
+        """Atomically move the oldest queued job to running and return it, or None"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+                    "started_at = ?, heartbeat_at = ?, message = ? WHERE id = ?",
+                    (RUNNING, worker_id, now, now, "Starting...", row["id"])
+                )
+                self._add_event(conn, row["id"], RUNNING, {"progress": row["progress"], "message": "Starting...", "attempt": row["attempts"] + 1}, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return {"id": row["id"], "kind": row["kind"], "cohort_name": row["cohort_name"], "payload": json.loads(row["payload"])}
+
+    def update_progress(self, job_id, progress, message, event_type="progress", **details):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = ?, heartbeat_at = ? WHERE id = ?",
+                (progress, message, now, job_id)
+            )
+            self._add_event(conn, job_id, event_type, {"progress": progress, "message": message, **details}, now)
+
+    def record_artifacts(self, job_id, **artifacts):
+        """Remember external resources (e.g. Drive file IDs) a job created, so a requeued run can clean them up"""
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                recorded = json.loads(row["artifacts"]) if row and row["artifacts"] else {}
+                recorded.update(artifacts)
+                conn.execute("UPDATE jobs SET artifacts = ? WHERE id = ?", (json.dumps(recorded), job_id))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def clear_artifacts(self, job_id):
+        with self._lock, self._connect() as conn:
+            conn.execute("UPDATE jobs SET artifacts = NULL WHERE id = ?", (job_id,))
+
+    def get_artifacts(self, job_id):
+        """Artifacts recorded by earlier attempts of a job"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT artifacts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["artifacts"]) if row and row["artifacts"] else {}
+
+    def heartbeat(self, job_ids):
+        if not job_ids:
+            return
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = ?",
+                [(now, job_id, RUNNING) for job_id in job_ids]
+            )
+
+    def complete(self, job_id, result, message):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, progress = 100, message = ?, result = ?, finished_at = ? WHERE id = ?",
+                (COMPLETED, message, json.dumps(result), now, job_id)
+            )
+            self._add_event(conn, job_id, COMPLETED, {"progress": 100, "message": message, **result}, now)
+
+    def fail(self, job_id, error):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, error = ?, finished_at = ? WHERE id = ?",
+                (FAILED, f"Error: {error}", error, now, job_id)
+            )
+            self._add_event(conn, job_id, FAILED, {"message": f"Error: {error}", "error": error}, now)
+
+    def requeue_stale(self, stale_after_seconds=JOB_STALE_AFTER_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        """
+        Return abandoned running jobs (worker died, deploy, crash) to the queue, or fail
+        them once they have used up their attempts. Returns the number of jobs touched.
+        """
+        now = time.time()
+        cutoff = now - stale_after_seconds
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stale = conn.execute(
+                    "SELECT id, attempts FROM jobs WHERE status = ? AND heartbeat_at < ?", (RUNNING, cutoff)
+                ).fetchall()
+                for row in stale:
+                    if row["attempts"] < max_attempts:
+                        self._add_event(conn, row["id"], QUEUED, {"message": "Requeued after its worker stopped"}, now)
+                    else:
+                        self._add_event(conn, row["id"], FAILED, {"message": "Error: worker stopped", "error": "Worker stopped before the job finished"}, now)
+                requeued = conn.execute(
+                    "UPDATE jobs SET status = ?, worker_id = NULL, message = ? "
+                    "WHERE status = ? AND heartbeat_at < ? AND attempts < ?",
+                    (QUEUED, "Requeued after its worker stopped", RUNNING, cutoff, max_attempts)
+                ).rowcount
+                failed = conn.execute(
+                    "UPDATE jobs SET status = ?, message = ?, error = ?, finished_at = ? "
+                    "WHERE status = ? AND heartbeat_at < ?",
+                    (FAILED, "Error: worker stopped", "Worker stopped before the job finished", now, RUNNING, cutoff)
+                ).rowcount
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        if requeued or failed:
+            logger.warning(f"Recovered stale jobs: {requeued} requeued, {failed} failed")
+        return requeued + failed
+
+    def evict_finished(self, ttl_seconds=JOB_RESULT_TTL_SECONDS):
+        """Delete completed and failed jobs older than the TTL"""
+        with self._lock, self._connect() as conn:
+            evicted = conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                (COMPLETED, FAILED, time.time() - ttl_seconds)
+            ).rowcount
+            conn.execute("DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)")
+        if evicted:
+            logger.info(f"Evicted {evicted} finished jobs")
+        return evicted
+
+    def claim_pool_pair(self, pair_ids, claimed_by):
+        """
+        Take the first of pair_ids that nobody has taken yet and return it, or None.
+        A pair is taken at most once, whether by a generation or by a pool deletion.
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for pair_id in pair_ids:
+                    if conn.execute("SELECT 1 FROM pool_claims WHERE pair_id = ?", (pair_id,)).fetchone() is None:
+                        conn.execute(
+                            "INSERT INTO pool_claims (pair_id, claimed_by, claimed_at) VALUES (?, ?, ?)",
+                            (pair_id, claimed_by, now)
+                        )
+                        conn.execute("COMMIT")
+                        return pair_id
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return None
+
+    def claimed_pool_pairs(self):
+        with self._lock, self._connect() as conn:
+            return {row["pair_id"] for row in conn.execute("SELECT pair_id FROM pool_claims")}
+
+    def evict_pool_claims(self, ttl_seconds):
+        """Forget claims older than the TTL; their pairs are renamed or deleted by then"""
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM pool_claims WHERE claimed_at < ?", (time.time() - ttl_seconds,))
+
+    def acquire_lease(self, name, holder, ttl_seconds):
+        """Take or renew the named lease; True when holder has it until ttl_seconds from now"""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT holder, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+                acquired = row is None or row["holder"] == holder or row["expires_at"] < now
+                if acquired:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO leases (name, holder, expires_at) VALUES (?, ?, ?)",
+                        (name, holder, now + ttl_seconds)
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return acquired
+
+    def release_lease(self, name, holder):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+    def get(self, job_id):
+        """Status of a job in the shape /task-status returns, or None"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        result = json.loads(row["result"]) if row["result"] else {}
+        status = {
+            "status": row["status"],
+            "progress": row["progress"],
+            "message": row["message"],
+            "cohort_name": row["cohort_name"],
+            "created_at": _isoformat(row["created_at"]),
+            "started_at": _isoformat(row["started_at"]),
+            "attempts": row["attempts"],
+            "google_slides_url": result.get("google_slides_url"),
+            "error": row["error"]
+        }
+        if row["status"] == COMPLETED:
+            status["completed_at"] = _isoformat(row["finished_at"])
+        elif row["status"] == FAILED:
+            status["failed_at"] = _isoformat(row["finished_at"])
+        return status
+
+_job_store = None
+_job_store_lock = threading.Lock()
+
+def get_job_store():
+    global _job_store
+    if _job_store is None:
+        with _job_store_lock:
+            if _job_store is None:
+                _job_store = JobStore()
+    return _job_store
@@ -0,0 +1,87 @@
+from genai_mediaplan.crew import kickoff_mediaplan_crew
+from genai_mediaplan.utils.forecast_data_api_based import export_table_as_json
+from genai_mediaplan.utils.update_google_slides_content import get_copy_of_presentation, delete_drive_files
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+GENERATE_MEDIAPLAN = "generate_mediaplan"
+
+# Progress reported when each crew task and Google Slides stage finishes
+CREW_TASK_COUNT = 6
+CREW_PROGRESS_START = 20
+CREW_PROGRESS_END = 75
+# Slides stages can finish in either order while the Drive copies run, so count them
+SLIDES_STAGE_COUNT = 5
+SLIDES_PROGRESS_START = 80
+SLIDES_PROGRESS_END = 98
+
+def run_mediaplan_generation(job_id, payload, store):
+    """
+    Job handler for /generate-mediaplan-async. Returns (result, final message).
+    """
+    cohort_name = payload["cohort_name"]
+    audience_data = payload.get("audience_data")
+    forecast_data = payload.get("forecast_data")
+    logger.info(f"Starting background mediaplan generation for task {job_id}, cohort: {cohort_name}")
+
+    # A requeued job starts over, so drop the half-filled deck and sheet of the earlier attempt
+    previous_copies = store.get_artifacts(job_id)
+    if previous_copies:
+        logger.info(f"Deleting copies left by an earlier attempt of task {job_id}")
+        delete_drive_files([previous_copies[key] for key in ("deck_id", "sheet_id") if previous_copies.get(key)])
+        store.clear_artifacts(job_id)
+
+    store.update_progress(job_id, 10, "Fetching data...")
+
+    # Use provided data or fetch from database
+    if audience_data and forecast_data:
+        logger.debug(f"Using provided data for cohort {cohort_name}")
+    else:
+        logger.debug(f"Fetching data from database for cohort {cohort_name}")
+        data = export_table_as_json(cohort_name)
+        audience_data = data['abvr']
+        forecast_data = data['results']
+
+    store.update_progress(job_id, CREW_PROGRESS_START, "Running CrewAI agents...")
+    logger.info(f"Running CrewAI agents for cohort {cohort_name}")
+
+    completed_tasks = []
+
+    def on_crew_task(task_output):
+        # Async crew tasks finish on their own threads
+        completed_tasks.append(task_output.name)
+        progress = CREW_PROGRESS_START + (CREW_PROGRESS_END - CREW_PROGRESS_START) * min(len(completed_tasks), CREW_TASK_COUNT) // CREW_TASK_COUNT
+        store.update_progress(job_id, progress, f"Finished {task_output.name}", event_type="crew_task", task=task_output.name)
+
+    inputs = {
+        'cohort_name': cohort_name,
+        'audience_data': audience_data
+    }
+    model_output_json = kickoff_mediaplan_crew(inputs, task_callback=on_crew_task, use_llm_cache=payload.get("use_llm_cache", True))
+
+    store.update_progress(job_id, SLIDES_PROGRESS_START, "Creating Google Slides presentation...")
+    logger.info(f"Creating Google Slides presentation for cohort {cohort_name}")
+
+    completed_stages = []
+
+    def on_slides_stage(stage):
+        completed_stages.append(stage)
+        progress = SLIDES_PROGRESS_START + (SLIDES_PROGRESS_END - SLIDES_PROGRESS_START) * min(len(completed_stages), SLIDES_STAGE_COUNT) // SLIDES_STAGE_COUNT
+        store.update_progress(job_id, progress, f"Slides: {stage.replace('_', ' ')}", event_type="slides_stage", stage=stage)
+
+    google_slides_url = get_copy_of_presentation(
+        cohort_name,
+        model_output_json,
+        forecast_data,
+        stage_callback=on_slides_stage,
+        copies_callback=lambda deck_id, sheet_id: store.record_artifacts(job_id, deck_id=deck_id, sheet_id=sheet_id)
+    )
+
+    logger.info(f"Successfully completed mediaplan generation for task {job_id}, cohort: {cohort_name}")
+    return {"google_slides_url": google_slides_url}, "Mediaplan generated successfully"
+
+# Job kind -> handler(job_id, payload, store)
+JOB_HANDLERS = {
+    GENERATE_MEDIAPLAN: run_mediaplan_generation,
+}
@@ -0,0 +1,127 @@
+import os
+import socket
+import threading
+import time
+from dotenv import load_dotenv
+from genai_mediaplan.jobs.job_store import get_job_store
+from genai_mediaplan.jobs.mediaplan_jobs import JOB_HANDLERS
+from genai_mediaplan.utils.update_google_slides_content import template_pool
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Jobs run concurrently per process; 0 leaves the jobs to a separate `uv run worker` process
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_MAINTENANCE_SECONDS = float(os.getenv("JOB_MAINTENANCE_SECONDS", "60"))
+
+class JobWorkerPool:
+    """
+    Fixed number of threads that claim queued jobs from the job store and run them.
+    A housekeeping thread sends heartbeats for the jobs running here, requeues jobs
+    abandoned by dead workers and evicts expired finished jobs.
+    """
+
+    def __init__(self, handlers, max_workers=JOB_WORKERS):
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self.worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self._running_jobs = set()
+        self._running_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        if self._threads:
+            return
+        store = get_job_store()
+        # Jobs left running by a previous deploy or crash go back on the queue
+        store.requeue_stale()
+        self._stop.clear()
+        for index in range(self.max_workers):
+            thread = threading.Thread(target=self._work, args=(f"{self.worker_prefix}:{index}",), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        housekeeping = threading.Thread(target=self._housekeeping, name="job-housekeeping", daemon=True)
+        housekeeping.start()
+        self._threads.append(housekeeping)
+        logger.info(f"Job worker pool started with {self.max_workers} workers")
+
+    def stop(self):
+        """Stop claiming new jobs; jobs still running are requeued by the next process once their heartbeat goes stale"""
+        self._stop.set()
+        self._wake.set()
+        self._threads = []
+        logger.info("Job worker pool stopped")
+
+    def notify(self):
+        """Wake an idle worker after a job was queued from this process"""
+        self._wake.set()
+
+    def _work(self, worker_id):
+        store = get_job_store()
+        while not self._stop.is_set():
+            try:
+                job = store.claim(worker_id)
+            except Exception as e:
+                logger.error(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(JOB_POLL_INTERVAL_SECONDS)
+                self._wake.clear()
+                continue
+            self._run(store, job)
+
+    def _run(self, store, job):
+        job_id = job["id"]
+        handler = self.handlers.get(job["kind"])
+        with self._running_lock:
+            self._running_jobs.add(job_id)
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind {job['kind']}")
+            result, message = handler(job_id, job["payload"], store)
+            store.complete(job_id, result, message)
+            logger.info(f"Job {job_id} completed")
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            store.fail(job_id, str(e))
+        finally:
+            with self._running_lock:
+                self._running_jobs.discard(job_id)
+
+    def _housekeeping(self):
+        store = get_job_store()
+        last_maintenance = 0.0
+        while not self._stop.wait(JOB_HEARTBEAT_SECONDS):
+            try:
+                with self._running_lock:
+                    running_jobs = list(self._running_jobs)
+                store.heartbeat(running_jobs)
+                if time.monotonic() - last_maintenance >= JOB_MAINTENANCE_SECONDS:
+                    store.requeue_stale()
+                    store.evict_finished()
+                    last_maintenance = time.monotonic()
+            except Exception as e:
+                logger.error(f"Error in job housekeeping: {e}")
+
+# Global pool instance
+job_pool = JobWorkerPool(JOB_HANDLERS)
+
+def main():
+    """Run a standalone worker process, sized independently of the API workers"""
+    load_dotenv(override=True)
+    pool = JobWorkerPool(JOB_HANDLERS, max_workers=max(JOB_WORKERS, 1))
+    pool.start()
+    template_pool.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pool.stop()
+        template_pool.stop()
+
+if __name__ == "__main__":
+    main()
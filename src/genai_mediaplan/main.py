@@ -1,13 +1,16 @@
 #!/usr/bin/env python
+import json
 import sys
 import warnings
 import os
+import time
 from datetime import datetime
 
-from genai_mediaplan.crew import GenaiMediaplan
+from genai_mediaplan.crew import GenaiMediaplan, kickoff_mediaplan_crew
 from genai_mediaplan.utils.forecast_data_api_based import export_table_as_json
-from genai_mediaplan.utils.helper import extract_json_from_markdown_or_json
 from genai_mediaplan.utils.update_google_slides_content import get_copy_of_presentation
+from genai_mediaplan.utils.batch_generation import generate_mediaplans
+from genai_mediaplan.utils.google_clients import load_credentials
 from dotenv import load_dotenv
 
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
@@ -22,6 +25,8 @@ def run():
     Run the crew.
     """
     load_dotenv(override=True)
+    # Sign in through the browser here, on the main thread, if there is no usable token
+    load_credentials(interactive=True)
     
     cohort_name = "Shopping"
     data = export_table_as_json(cohort_name)
@@ -32,13 +37,62 @@ def run():
         'audience_data': audience_data
     }
     try:
-        GenaiMediaplan().crew().kickoff(inputs=inputs)
-        model_output_json = extract_json_from_markdown_or_json("final_report.md")
+        model_output_json = kickoff_mediaplan_crew(inputs)
         get_copy_of_presentation(cohort_name, model_output_json, forecast_data)
     except Exception as e:
         raise Exception(f"An error occurred while running the crew: {e}")
 
 
+def benchmark():
+    """
+    Compare crew wall time with sequential and parallel task execution.
+    """
+    load_dotenv(override=True)
+
+    cohort_name = sys.argv[1] if len(sys.argv) > 1 else "Shopping"
+    data = export_table_as_json(cohort_name)
+    inputs = {
+        'cohort_name': cohort_name,
+        'audience_data': data['abvr']
+    }
+    original_mode = os.environ.get("CREW_PARALLEL_TASKS")
+    timings = {}
+    try:
+        for mode in ("sequential", "parallel"):
+            os.environ["CREW_PARALLEL_TASKS"] = "true" if mode == "parallel" else "false"
+            crew = GenaiMediaplan().crew()
+            # Both runs must call the models; the second would otherwise replay the first's outputs
+            for crew_agent in crew.agents:
+                crew_agent.use_output_cache = False
+            start = time.monotonic()
+            crew.kickoff(inputs=inputs)
+            timings[mode] = time.monotonic() - start
+    except Exception as e:
+        raise Exception(f"An error occurred while benchmarking the crew: {e}")
+    finally:
+        if original_mode is None:
+            os.environ.pop("CREW_PARALLEL_TASKS", None)
+        else:
+            os.environ["CREW_PARALLEL_TASKS"] = original_mode
+
+    print(f"Sequential: {timings['sequential']:.1f}s, parallel: {timings['parallel']:.1f}s "
+          f"({timings['sequential'] / timings['parallel']:.2f}x)")
+
+
+def batch():
+    """
+    Generate mediaplans for the cohorts given on the command line, printing one JSON line per cohort.
+    """
+    load_dotenv(override=True)
+
+    cohort_names = sys.argv[1:]
+    if not cohort_names:
+        raise Exception("Usage: batch <cohort name> [<cohort name> ...]")
+    load_credentials(interactive=True)
+    for result in generate_mediaplans(cohort_names):
+        print(json.dumps(result), flush=True)
+
+
 def train():
     """
     Train the crew for a given number of iterations.
@@ -0,0 +1,30 @@
+from typing import List, Optional
+from pydantic import BaseModel
+
+# Structure of the crew's final output, as consumed by get_content_to_replace_in_slides
+
+class DataSignalCategory(BaseModel):
+    title: str
+    data_signals: List[str]
+
+class Persona(BaseModel):
+    title: str
+    description: str
+    segments: Optional[int] = None
+    target_profiles: List[str] = []
+
+class Insight(BaseModel):
+    title: str
+    description: str
+
+class Recommendation(BaseModel):
+    title: str
+    description: str
+
+class MediaplanOutput(BaseModel):
+    cohort_definition: str
+    data_signals: List[DataSignalCategory]
+    personas: List[Persona]
+    insights: List[Insight]
+    market_edge: str
+    recommendations: List[Recommendation]
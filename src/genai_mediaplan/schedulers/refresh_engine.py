@@ -0,0 +1,126 @@
+import json
+import os
+import time
+import concurrent.futures
+from genai_mediaplan.utils.forecast_data_api_based import export_table_as_json
+from genai_mediaplan.utils.cohort_catalog import cohort_catalog
+from genai_mediaplan.utils.update_forecast_data_in_slides import update_forecast_data_for_cohort
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+MEDIAPLAN_RESPONSES_FILE = 'mediaplan_responses.json'
+REFRESH_MAX_WORKERS = int(os.getenv("REFRESH_MAX_WORKERS", "4"))
+# Transient Google errors are retried per API call (google_rate_limit); retrying the
+# whole cohort on top of that only repeats calls that already succeeded
+REFRESH_MAX_ATTEMPTS = int(os.getenv("REFRESH_MAX_ATTEMPTS", "1"))
+REFRESH_RETRY_DELAY_SECONDS = float(os.getenv("REFRESH_RETRY_DELAY_SECONDS", "5"))
+
+def load_cohort_presentations(path=MEDIAPLAN_RESPONSES_FILE):
+    """Map each generated cohort to its presentation ID ('' when none was recorded)"""
+    with open(path, 'r') as f:
+        data = json.loads(f.read())
+    return {
+        cohort_name: entry.get('google_slides_url', '').replace("https://docs.google.com/presentation/d/", "")
+        for cohort_name, entry in data.items()
+    }
+
+def refresh_cohort(cohort_name, presentation_id, max_attempts=REFRESH_MAX_ATTEMPTS, retry_delay=REFRESH_RETRY_DELAY_SECONDS, force=False):
+    """
+    Fetch the latest forecast for one cohort and write it into its presentation.
+    Unless `force` is set, a cohort whose forecast matches the last applied one is
+    reported as "unchanged" without touching the presentation.
+    """
+    result = {
+        "cohort_name": cohort_name,
+        "presentation_id": presentation_id,
+        "status": "skipped",
+        "attempts": 0,
+        "duration_seconds": 0.0,
+        "error": None
+    }
+    if not presentation_id:
+        logger.warning(f"No presentation ID found for cohort {cohort_name}, skipping")
+        result["error"] = "No presentation ID found"
+        return result
+
+    start = time.monotonic()
+    while result["attempts"] < max_attempts:
+        result["attempts"] += 1
+        try:
+            logger.info(f"Processing cohort: {cohort_name} (attempt {result['attempts']}/{max_attempts})")
+            data_to_update = export_table_as_json(cohort_name)
+            forecast_data = data_to_update['results']
+            logger.info(f"Updating data for {cohort_name} with presentation ID {presentation_id}")
+            logger.debug(f"Found {len(forecast_data.keys())} forecast data keys for {cohort_name}")
+            applied_requests = update_forecast_data_for_cohort(forecast_data, presentation_id, skip_unchanged=not force)
+            if applied_requests is None:
+                result["status"] = "unchanged"
+            else:
+                logger.info(f"Successfully updated data for {cohort_name}")
+                result["status"] = "success"
+            result["error"] = None
+            break
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+            logger.error(f"Failed to update data for {cohort_name}: {str(e)}")
+            if result["attempts"] < max_attempts:
+                time.sleep(retry_delay * result["attempts"])
+    result["duration_seconds"] = round(time.monotonic() - start, 2)
+    return result
+
+def refresh_all_cohorts(cohorts=None, max_workers=None, max_attempts=None, force=False):
+    """
+    Refresh every cohort's presentation with up to `max_workers` cohorts in flight.
+
+    A failing cohort is retried on its own and never stops the others. Cohorts whose
+    forecast has not changed since the last refresh are skipped unless `force` is set.
+    Returns a summary with per-cohort status, attempts and timings.
+    """
+    if cohorts is None:
+        cohorts = load_cohort_presentations()
+    max_workers = max(1, max_workers or REFRESH_MAX_WORKERS)
+    max_attempts = max(1, max_attempts or REFRESH_MAX_ATTEMPTS)
+    logger.info(f"Starting to refresh all cohort data... Found {len(cohorts)} cohorts, using {max_workers} workers")
+    # Start from a current catalog; every cohort below then resolves against this one download
+    cohort_catalog.invalidate()
+
+    start = time.monotonic()
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="cohort-refresh") as executor:
+        futures = {
+            executor.submit(refresh_cohort, cohort_name, presentation_id, max_attempts, REFRESH_RETRY_DELAY_SECONDS, force): cohort_name
+            for cohort_name, presentation_id in cohorts.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            cohort_name = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.error(f"Unexpected error refreshing {cohort_name}: {str(e)}")
+                results.append({
+                    "cohort_name": cohort_name,
+                    "presentation_id": cohorts[cohort_name],
+                    "status": "failed",
+                    "attempts": 0,
+                    "duration_seconds": 0.0,
+                    "error": str(e)
+                })
+
+    results.sort(key=lambda result: result["cohort_name"])
+    summary = {
+        "total": len(results),
+        "succeeded": sum(1 for result in results if result["status"] == "success"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "unchanged": sum(1 for result in results if result["status"] == "unchanged"),
+        "skipped": sum(1 for result in results if result["status"] == "skipped"),
+        "max_workers": max_workers,
+        "duration_seconds": round(time.monotonic() - start, 2),
+        "results": results
+    }
+    logger.info(
+        f"Refreshed {summary['total']} cohorts in {summary['duration_seconds']}s: "
+        f"{summary['succeeded']} succeeded, {summary['unchanged']} unchanged, {summary['failed']} failed, {summary['skipped']} skipped"
+    )
+    return summary
@@ -0,0 +1,119 @@
+from collections import namedtuple
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+AltTextEntry = namedtuple(
+    'AltTextEntry',
+    ['slide_index', 'object_id', 'kind', 'element', 'text_elements', 'lines', 'paragraph_style', 'table']
+)
+
+ELEMENT_KINDS = ('shape', 'table', 'sheetsChart', 'image', 'line', 'video', 'wordArt', 'elementGroup')
+
+def get_element_kind(element):
+    for kind in ELEMENT_KINDS:
+        if kind in element:
+            return kind
+    return 'unknown'
+
+def parse_text_lines(text_elements):
+    """Split a shape's text into (line, style of its first run) pairs plus the first paragraph style"""
+    lines = []
+    current_line = ""
+    current_style = None
+
+    for elem in text_elements:
+        if 'textRun' in elem:
+            content = elem['textRun'].get('content', '')
+            style = elem['textRun'].get('style', {})
+            for char in content:
+                if char == '\n':
+                    lines.append((current_line, current_style))
+                    current_line = ""
+                else:
+                    if current_line == "":
+                        current_style = style
+                    current_line += char
+        elif 'paragraphMarker' in elem:
+            if current_line:
+                lines.append((current_line, current_style))
+                current_line = ""
+
+    if current_line:
+        lines.append((current_line, current_style))
+
+    paragraph_style = None
+    for elem in text_elements:
+        if 'paragraphMarker' in elem and 'style' in elem['paragraphMarker']:
+            paragraph_style = elem['paragraphMarker']['style']
+            break
+
+    return lines, paragraph_style
+
+class AltTextIndex:
+    """Alt-text description -> page elements carrying it, built in one pass over the deck"""
+
+    def __init__(self, slides):
+        self._entries = {}
+        for slide_index, slide in enumerate(slides):
+            for element in slide.get('pageElements', []):
+                description = element.get('description')
+                if not description:
+                    continue
+                kind = get_element_kind(element)
+                text_elements, lines, paragraph_style = [], [], None
+                if kind == 'shape':
+                    text_elements = element['shape'].get('text', {}).get('textElements', [])
+                    lines, paragraph_style = parse_text_lines(text_elements)
+                self._entries.setdefault(description, []).append(AltTextEntry(
+                    slide_index=slide_index,
+                    object_id=element['objectId'],
+                    kind=kind,
+                    element=element,
+                    text_elements=text_elements,
+                    lines=lines,
+                    paragraph_style=paragraph_style,
+                    table=element.get('table'),
+                ))
+
+        duplicates = self.duplicates()
+        logger.debug(f"Indexed {len(self._entries)} alt-texts, {len(duplicates)} used more than once")
+
+    def __contains__(self, description):
+        return description in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, description, kind=None):
+        """All elements with this alt-text, optionally restricted to one element kind"""
+        entries = self._entries.get(description, [])
+        if kind is not None:
+            entries = [entry for entry in entries if entry.kind == kind]
+        return entries
+
+    def first(self, description, kind=None):
+        entries = self.get(description, kind)
+        return entries[0] if entries else None
+
+    def duplicates(self):
+        return {description: entries for description, entries in self._entries.items() if len(entries) > 1}
+
+    def unmatched(self, descriptions, kind=None):
+        return [description for description in descriptions if not self.get(description, kind)]
+
+    def report_unmatched(self, descriptions, kind=None):
+        missing = self.unmatched(descriptions, kind)
+        if missing:
+            logger.warning(f"No {kind or 'page'} element found for alt-text(s): {missing}")
+        return missing
+
+    def report_duplicates(self, descriptions, kind=None):
+        duplicated = {}
+        for description in descriptions:
+            entries = self.get(description, kind)
+            if len(entries) > 1:
+                duplicated[description] = [entry.slide_index for entry in entries]
+        if duplicated:
+            logger.warning(f"Alt-text(s) used by more than one {kind or 'page'} element (slide indexes): {duplicated}")
+        return duplicated
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+AUDIENCE_CACHE_MAX_ENTRIES = int(os.getenv("AUDIENCE_CACHE_MAX_ENTRIES", "5000"))
+AUDIENCE_CACHE_TTL_SECONDS = float(os.getenv("AUDIENCE_CACHE_TTL_SECONDS", "86400"))
+# abvrs the service did not return are remembered for a shorter time, so they are not re-requested on every run
+AUDIENCE_CACHE_MISS_TTL_SECONDS = float(os.getenv("AUDIENCE_CACHE_MISS_TTL_SECONDS", "3600"))
+# Optional JSON file backing the cache across restarts; unset keeps it in memory only
+AUDIENCE_CACHE_PATH = os.getenv("AUDIENCE_CACHE_PATH")
+
+class AudienceInfoCache:
+    """
+    LRU cache of audience info per abvr with TTL expiry and an optional on-disk copy.
+    Unknown abvrs are cached as misses (info None) with their own, shorter TTL.
+    """
+
+    def __init__(self, max_entries=AUDIENCE_CACHE_MAX_ENTRIES, ttl_seconds=AUDIENCE_CACHE_TTL_SECONDS, path=AUDIENCE_CACHE_PATH, miss_ttl_seconds=AUDIENCE_CACHE_MISS_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self.path = path
+        # abvr -> (stored_at epoch seconds, info or None for a miss); most recently used last
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+            now = time.time()
+            for abvr, (stored_at, info) in sorted(stored.items(), key=lambda item: item[1][0]):
+                if now - stored_at <= self._ttl(info):
+                    self._entries[abvr] = (stored_at, info)
+            self._evict()
+            logger.info(f"Loaded {len(self._entries)} audience info entries from {self.path}")
+        except Exception as e:
+            logger.error(f"Error loading audience cache from {self.path}: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(dict(self._entries), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving audience cache to {self.path}: {e}")
+
+    def _ttl(self, info):
+        return self.ttl_seconds if info is not None else self.miss_ttl_seconds
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_many(self, abvrs):
+        """
+        Split abvrs into ({abvr: info} still fresh in the cache, [abvrs to fetch]).
+        Abvrs with a fresh cached miss are in neither.
+        """
+        found = {}
+        missing = []
+        now = time.time()
+        with self._lock:
+            for abvr in abvrs:
+                entry = self._entries.get(abvr)
+                if entry and now - entry[0] <= self._ttl(entry[1]):
+                    self._entries.move_to_end(abvr)
+                    if entry[1] is not None:
+                        found[abvr] = entry[1]
+                else:
+                    self._entries.pop(abvr, None)
+                    missing.append(abvr)
+        return found, missing
+
+    def put_many(self, infos):
+        if not infos:
+            return
+        now = time.time()
+        with self._lock:
+            for abvr, info in infos.items():
+                self._entries[abvr] = (now, info)
+                self._entries.move_to_end(abvr)
+            self._evict()
+            self._save()
+
+    def put_misses(self, abvrs):
+        """Remember abvrs the service returned nothing for"""
+        self.put_many({abvr: None for abvr in abvrs})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+# Global cache instance
+audience_cache = AudienceInfoCache()
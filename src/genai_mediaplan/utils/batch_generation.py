@@ -0,0 +1,85 @@
+import concurrent.futures
+import os
+import time
+from datetime import datetime
+from genai_mediaplan.crew import kickoff_mediaplan_crew
+from genai_mediaplan.utils.forecast_data_api_based import export_tables_as_json
+from genai_mediaplan.utils.update_google_slides_content import get_copy_of_presentation, template_layout_cache
+from genai_mediaplan.utils.google_clients import get_slides_service
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "3"))
+
+def generate_mediaplan_for_cohort(cohort_name, data, template_snapshot):
+    start = time.monotonic()
+    result = {
+        "cohort_name": cohort_name,
+        "status": "failed",
+        "google_slides_url": None,
+        "error": None
+    }
+    try:
+        if not data:
+            raise ValueError(f"No forecast data for cohort '{cohort_name}'")
+        inputs = {
+            'cohort_name': cohort_name,
+            'audience_data': data['abvr']
+        }
+        model_output_json = kickoff_mediaplan_crew(inputs)
+        result["google_slides_url"] = get_copy_of_presentation(
+            cohort_name,
+            model_output_json,
+            data['results'],
+            template_snapshot=template_snapshot
+        )
+        result["status"] = "success"
+    except Exception as e:
+        logger.error(f"Batch generation failed for {cohort_name}: {e}")
+        result["error"] = str(e)
+    result["duration_seconds"] = round(time.monotonic() - start, 2)
+    return result
+
+def generate_mediaplans(cohort_names, max_workers=None):
+    """
+    Generate decks for many cohorts, `max_workers` at a time, yielding one result per
+    cohort as it finishes followed by a summary. The forecast data for the whole batch
+    comes from one catalog load, and every deck is built from one read of the template.
+    """
+    cohort_names = list(dict.fromkeys(cohort_names))
+    max_workers = max_workers or BATCH_MAX_WORKERS
+    start = time.monotonic()
+    logger.info(f"Generating mediaplans for {len(cohort_names)} cohorts with {max_workers} workers")
+
+    data_by_cohort = export_tables_as_json(cohort_names)
+    template_snapshot = template_layout_cache.get(get_slides_service())
+
+    succeeded = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mediaplan-batch") as executor:
+        futures = [
+            executor.submit(generate_mediaplan_for_cohort, cohort_name, data_by_cohort.get(cohort_name), template_snapshot)
+            for cohort_name in cohort_names
+        ]
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                if result["status"] == "success":
+                    succeeded += 1
+                yield result
+        except GeneratorExit:
+            # The consumer went away; finish the cohorts already running and skip the rest
+            for future in futures:
+                future.cancel()
+            raise
+
+    yield {
+        "summary": {
+            "total": len(cohort_names),
+            "succeeded": succeeded,
+            "failed": len(cohort_names) - succeeded,
+            "max_workers": max_workers,
+            "duration_seconds": round(time.monotonic() - start, 2),
+            "finished_at": datetime.now().isoformat()
+        }
+    }
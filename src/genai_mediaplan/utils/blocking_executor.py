@@ -0,0 +1,96 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Crew runs, slide generation and refreshes: minutes each, so only a few at a time
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", "2"))
+GENERATION_MAX_QUEUE = int(os.getenv("GENERATION_MAX_QUEUE", "4"))
+GENERATION_RETRY_AFTER_SECONDS = int(os.getenv("GENERATION_RETRY_AFTER_SECONDS", "60"))
+# Short blocking calls: catalog lookups, job store reads and writes
+IO_MAX_CONCURRENCY = int(os.getenv("IO_MAX_CONCURRENCY", "16"))
+IO_MAX_QUEUE = int(os.getenv("IO_MAX_QUEUE", "64"))
+IO_RETRY_AFTER_SECONDS = int(os.getenv("IO_RETRY_AFTER_SECONDS", "1"))
+
+class ExecutorSaturatedError(Exception):
+    """Raised instead of queueing when an executor already holds its maximum number of calls"""
+
+    def __init__(self, name, retry_after_seconds):
+        super().__init__(f"{name} executor is saturated, retry in {retry_after_seconds}s")
+        self.name = name
+        self.retry_after_seconds = retry_after_seconds
+
+class BlockingExecutor:
+    """
+    Thread pool for blocking work called from async endpoints, so the event loop stays
+    free for /health and other requests. At most max_concurrency calls run and max_queue
+    more wait; anything beyond that is rejected straight away with ExecutorSaturatedError.
+    """
+
+    def __init__(self, name, max_concurrency, max_queue, retry_after_seconds):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.retry_after_seconds = retry_after_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-executor")
+        self._slots = threading.BoundedSemaphore(max_concurrency + max_queue)
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+
+    def _release(self, _future):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    async def run(self, func, *args, **kwargs):
+        self.reserve()
+        try:
+            future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        except Exception:
+            self._release(None)
+            raise
+        # The slot is freed when the thread finishes, even if the awaiting request was cancelled
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def reserve(self, count=1):
+        """
+        Take slots for work that manages its own threads, such as a streamed batch that
+        runs `count` generations at once. Raises ExecutorSaturatedError, holding nothing,
+        when they are not all free; call the returned function to free them.
+        """
+        taken = 0
+        while taken < count and self._slots.acquire(blocking=False):
+            taken += 1
+        if taken < count:
+            for _ in range(taken):
+                self._slots.release()
+            logger.warning(f"{self.name} executor saturated ({self.max_concurrency} running, {self.max_queue} queued), rejecting call")
+            raise ExecutorSaturatedError(self.name, self.retry_after_seconds)
+        with self._in_flight_lock:
+            self._in_flight += count
+
+        def release():
+            for _ in range(count):
+                self._release(None)
+        return release
+
+    def stats(self):
+        with self._in_flight_lock:
+            in_flight = self._in_flight
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": in_flight
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+# Global executor instances
+generation_executor = BlockingExecutor("generation", GENERATION_MAX_CONCURRENCY, GENERATION_MAX_QUEUE, GENERATION_RETRY_AFTER_SECONDS)
+io_executor = BlockingExecutor("io", IO_MAX_CONCURRENCY, IO_MAX_QUEUE, IO_RETRY_AFTER_SECONDS)
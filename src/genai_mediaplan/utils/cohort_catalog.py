@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from genai_mediaplan.utils import http_client
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+COHORT_CATALOG_TTL_SECONDS = float(os.getenv("COHORT_CATALOG_TTL_SECONDS", "900"))
+# A lookup for an unknown cohort reloads the catalog at most this often, so newly created cohorts show up
+COHORT_CATALOG_MISS_RELOAD_SECONDS = float(os.getenv("COHORT_CATALOG_MISS_RELOAD_SECONDS", "60"))
+
+def fetch_all_cohorts():
+    return http_client.get(f"{os.getenv('MEDIAPLAN_URL')}/get-all-mediaplan-cohorts").json()
+
+class CohortCatalog:
+    """TTL cache of /get-all-mediaplan-cohorts indexed by cohort name"""
+
+    def __init__(self, ttl_seconds=COHORT_CATALOG_TTL_SECONDS, miss_reload_seconds=COHORT_CATALOG_MISS_RELOAD_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.miss_reload_seconds = miss_reload_seconds
+        self._cohorts_by_name = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def _age(self):
+        return time.monotonic() - self._loaded_at
+
+    def _load(self, max_age_seconds):
+        with self._lock:
+            if self._cohorts_by_name is None or self._age() > max_age_seconds:
+                cohorts = fetch_all_cohorts()
+                self._cohorts_by_name = {cohort["name"]: cohort for cohort in cohorts}
+                self._loaded_at = time.monotonic()
+                logger.info(f"Loaded cohort catalog with {len(self._cohorts_by_name)} cohorts")
+            return self._cohorts_by_name
+
+    def get(self, cohort_name):
+        """Catalog record for a cohort, or None if upstream does not know it"""
+        cohort = self._load(self.ttl_seconds).get(cohort_name)
+        if cohort is None:
+            cohort = self._load(self.miss_reload_seconds).get(cohort_name)
+        return cohort
+
+    def names(self):
+        return sorted(self._load(self.ttl_seconds).keys())
+
+    def all(self):
+        return list(self._load(self.ttl_seconds).values())
+
+    def invalidate(self):
+        """Drop the cached catalog; the next lookup fetches it again"""
+        with self._lock:
+            self._cohorts_by_name = None
+            self._loaded_at = 0.0
+        logger.info("Cohort catalog invalidated")
+
+# Global catalog instance
+cohort_catalog = CohortCatalog()
@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Set to "true" to also fetch the unmasked response on each masked read and log the bytes saved.
+# This doubles the reads, so only enable it while measuring.
+MEASURE_FIELD_MASK_SAVINGS = os.getenv("MEASURE_FIELD_MASK_SAVINGS", "false").lower() == "true"
+
+def presentation_fields(*element_fields):
+    """
+    Field mask for presentations().get covering slide object IDs plus the given
+    page element fields, e.g. presentation_fields("description", "table").
+    """
+    fields = ["objectId"]
+    for field in element_fields:
+        if field not in fields:
+            fields.append(field)
+    return f"slides(objectId,pageElements({','.join(fields)}))"
+
+def payload_size(response):
+    """Size in bytes of a decoded API response re-serialised as compact JSON"""
+    return len(json.dumps(response, separators=(',', ':'), ensure_ascii=False).encode('utf-8'))
+
+def measure_field_mask_savings(label, full_request, masked_response):
+    full_bytes = payload_size(full_request.execute())
+    masked_bytes = payload_size(masked_response)
+    saved_bytes = full_bytes - masked_bytes
+    logger.info(
+        f"{label}: {masked_bytes} bytes with field mask vs {full_bytes} bytes unmasked "
+        f"({saved_bytes} bytes saved, {saved_bytes * 100 // max(full_bytes, 1)}%)"
+    )
+    return {"full_bytes": full_bytes, "masked_bytes": masked_bytes, "saved_bytes": saved_bytes}
+
+def get_presentation(slides_service, presentation_id, fields):
+    response = slides_service.presentations().get(presentationId=presentation_id, fields=fields).execute()
+    # Sizing re-serialises the whole response, so only do it when it gets logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"presentations.get {presentation_id}: {payload_size(response)} bytes for fields {fields}")
+    if MEASURE_FIELD_MASK_SAVINGS:
+        measure_field_mask_savings(
+            f"presentations.get {presentation_id}",
+            slides_service.presentations().get(presentationId=presentation_id),
+            response
+        )
+    return response
+
+def get_spreadsheet(sheets_service, spreadsheet_id, fields):
+    response = sheets_service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        includeGridData=False,
+        fields=fields
+    ).execute()
+    # Sizing re-serialises the whole response, so only do it when it gets logged
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"spreadsheets.get {spreadsheet_id}: {payload_size(response)} bytes for fields {fields}")
+    if MEASURE_FIELD_MASK_SAVINGS:
+        measure_field_mask_savings(
+            f"spreadsheets.get {spreadsheet_id}",
+            sheets_service.spreadsheets().get(spreadsheetId=spreadsheet_id, includeGridData=False),
+            response
+        )
+    return response
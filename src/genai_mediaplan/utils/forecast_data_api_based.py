@@ -1,46 +1,107 @@
 import json
-import requests
 import os
+import concurrent.futures
+from genai_mediaplan.utils import http_client
+from genai_mediaplan.utils.cohort_catalog import cohort_catalog
+from genai_mediaplan.utils.audience_cache import audience_cache
 from genai_mediaplan.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+EXPORT_BATCH_MAX_WORKERS = int(os.getenv("EXPORT_BATCH_MAX_WORKERS", "8"))
+
+# Runs the cohort-details GET alongside the audience-info POST of the same cohort
+_fetch_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=http_client.HTTP_POOL_SIZE,
+    thread_name_prefix="forecast-fetch"
+)
+
+def split_abvrs(abvr):
+    if isinstance(abvr, str):
+        return [code.strip() for code in abvr.split(",") if code.strip()]
+    return list(abvr)
+
 def get_audience_data(abvr):
-    final_data = {}
-    url=f"{os.getenv('AUDIENCE_INFO_URL')}/getAudienceInfo"
-    try:
-        response = requests.post(url, data=abvr)
-        data = response.json()
-        for item in data:
-            final_data[item["abvr"]] = {"name": item["audience_name"], "description": item["description"]}
-    except Exception as e:
-        logger.error(f"Error in getting audience data: {e}")
-        return {}
+    """
+    Audience name and description per abvr, given as a comma-separated string or a
+    list. Only abvrs missing from the cache are requested from the audience-info
+    service, always as the comma-separated body it expects; abvrs it does not know
+    are cached as misses. If that request fails, only the cached abvrs are returned.
+    """
+    codes = split_abvrs(abvr)
+    cached, missing = audience_cache.get_many(codes)
+    fetched = {}
+    if missing:
+        url=f"{os.getenv('AUDIENCE_INFO_URL')}/getAudienceInfo"
+        try:
+            response = http_client.post(url, data=",".join(missing))
+            data = response.json()
+            for item in data:
+                fetched[item["abvr"]] = {"name": item["audience_name"], "description": item["description"]}
+        except Exception as e:
+            # Keep the cached hits; the missing abvrs are requested again next time
+            logger.error(f"Error in getting audience data for {len(missing)} uncached abvrs, using the {len(cached)} cached: {e}")
+            return dict(cached)
+        audience_cache.put_many(fetched)
+        audience_cache.put_misses([code for code in missing if code not in fetched])
+    logger.debug(f"Audience info: {len(cached)} cached, {len(fetched)} fetched of {len(codes)} abvrs")
+
+    final_data = dict(cached)
+    final_data.update(fetched)
     return final_data
-    
-def export_table_as_json(cohort_name):
+
+def get_cohort_details(cohort_id):
+    return http_client.get(f"{os.getenv('MEDIAPLAN_URL')}/get-mediaplan-cohort-by-id/{cohort_id}").json()
+
+def export_cohort_as_json(cohort):
+    """Fetch audience info and forecast results for a cohort record from the catalog"""
     final_output = {"results": {}, "abvr": {}}
+    # Both calls only need the cohort record, so they run concurrently
+    details_future = _fetch_executor.submit(get_cohort_details, cohort["id"])
+    final_output["abvr"] = get_audience_data(cohort["abvrs"])
+    cohort_details = details_future.result()
+
+    parent_info = cohort_details["parentTemplatesInfo"]
+    if not parent_info:
+        raise ValueError(f"No parentTemplatesInfo found for cohort '{cohort['name']}'.")
+    for _, value in parent_info.items():
+        preset_data = json.loads(value["result"])
+        preset_name = value["name"].split()[0].strip()
+        final_output["results"][preset_name] = preset_data
+
+    return final_output
+
+def export_table_as_json(cohort_name):
     try:
-        all_cohorts = requests.get(f"{os.getenv('MEDIAPLAN_URL')}/get-all-mediaplan-cohorts").json()
-        cohort = next((c for c in all_cohorts if c["name"] == cohort_name), None)
+        cohort = cohort_catalog.get(cohort_name)
         if not cohort:
             raise ValueError(f"Cohort '{cohort_name}' not found.")
-    
-        abvrs = cohort["abvrs"]
-        final_output["abvr"] = get_audience_data(abvrs)
-        cohort_id = cohort["id"]
-        
-        cohort_details = requests.get(f"{os.getenv('MEDIAPLAN_URL')}/get-mediaplan-cohort-by-id/{cohort_id}").json()
-        parent_info = cohort_details["parentTemplatesInfo"]
-        if not parent_info:
-            raise ValueError(f"No parentTemplatesInfo found for cohort '{cohort_name}'.")
-        for _, value in parent_info.items():
-            preset_data = json.loads(value["result"])
-            preset_name = value["name"].split()[0].strip()
-            final_output["results"][preset_name] = preset_data
-        
-        return final_output
-    
+        return export_cohort_as_json(cohort)
+
     except Exception as e:
         logger.error(f"Error in getting forecast data: {e}")
-        return {}
\ No newline at end of file
+        return {}
+
+def export_tables_as_json(cohort_names, max_workers=None):
+    """
+    Batch variant of export_table_as_json: up to `max_workers` cohorts fetched
+    concurrently against the cached catalog. Returns {cohort_name: output}, with {}
+    for cohorts that could not be fetched.
+    """
+    cohort_names = list(cohort_names)
+
+    def export(cohort_name):
+        try:
+            cohort = cohort_catalog.get(cohort_name)
+            if not cohort:
+                raise ValueError(f"Cohort '{cohort_name}' not found.")
+            return export_cohort_as_json(cohort)
+        except Exception as e:
+            logger.error(f"Error in getting forecast data for {cohort_name}: {e}")
+            return {}
+
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers or EXPORT_BATCH_MAX_WORKERS,
+        thread_name_prefix="forecast-batch"
+    ) as executor:
+        return dict(zip(cohort_names, executor.map(export, cohort_names)))
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+FORECAST_HASH_STORE_PATH = os.getenv("FORECAST_HASH_STORE_PATH", "forecast_hashes.json")
+
+def forecast_data_hash(forecast_data):
+    """
+    Canonical hash of the forecast applied to a deck. The month is part of it because
+    the deck's date line and file title change monthly even when the numbers do not.
+    """
+    payload = {
+        "period": datetime.now().strftime("%B%Y"),
+        "forecast": forecast_data
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class ForecastHashStore:
+    """Hash of the forecast last written to each presentation, persisted as JSON"""
+
+    def __init__(self, path=FORECAST_HASH_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hashes = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Error loading forecast hashes from {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._hashes, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving forecast hashes to {self.path}: {e}")
+
+    def get(self, presentation_id):
+        with self._lock:
+            return self._hashes.get(presentation_id, {}).get("hash")
+
+    def set(self, presentation_id, forecast_hash):
+        with self._lock:
+            self._hashes[presentation_id] = {
+                "hash": forecast_hash,
+                "applied_at": datetime.now().isoformat()
+            }
+            self._save()
+
+    def discard(self, presentation_id):
+        with self._lock:
+            if self._hashes.pop(presentation_id, None) is not None:
+                self._save()
+
+# Global store instance
+forecast_hash_store = ForecastHashStore()
@@ -0,0 +1,111 @@
+import os
+import threading
+import httplib2
+from google.oauth2.credentials import Credentials
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build
+from genai_mediaplan.utils.google_rate_limit import RateLimitedHttpRequest
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SCOPES = ['https://www.googleapis.com/auth/drive']
+CLIENT_SECRET_FILE = os.getenv("GOOGLE_CLIENT_SECRET_FILE", "client_secret_drive.json")
+TOKEN_FILE = os.getenv("GOOGLE_TOKEN_FILE", "token.json")
+GOOGLE_HTTP_TIMEOUT_SECONDS = float(os.getenv("GOOGLE_HTTP_TIMEOUT_SECONDS", "120"))
+
+# (service name, version) of every Google API the app calls
+DRIVE = ("drive", "v3")
+SLIDES = ("slides", "v1")
+SHEETS = ("sheets", "v4")
+
+_credentials = None
+_lock = threading.Lock()
+# httplib2 connections are not thread-safe, so every thread gets its own clients
+_thread_clients = threading.local()
+
+class GoogleCredentialsError(Exception):
+    """Raised when there is no usable OAuth token and the interactive sign-in is not allowed"""
+
+def _load_credentials(interactive):
+    creds = None
+    if os.path.exists(TOKEN_FILE):
+        creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+    if not creds or not creds.valid:
+        if creds and creds.expired and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+            except Exception as e:
+                if not interactive:
+                    raise GoogleCredentialsError(f"Could not refresh the Google token in {TOKEN_FILE}: {e}") from e
+                logger.warning(f"Could not refresh the Google token, signing in again: {e}")
+                creds = None
+        if not creds or not creds.valid:
+            if not interactive:
+                raise GoogleCredentialsError(
+                    f"No valid Google token in {TOKEN_FILE}; run a CLI command such as `uv run run_crew` once to sign in"
+                )
+            # Only the CLI signs in, so the OAuth flow library is not imported by servers
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
+            creds = flow.run_local_server(port=0)
+        # Save token for future use
+        with open(TOKEN_FILE, 'w') as token:
+            token.write(creds.to_json())
+    return creds
+
+def load_credentials(interactive=False):
+    """
+    Load the OAuth credentials shared by every Google client. Without `interactive`
+    a missing or unrefreshable token raises GoogleCredentialsError; only CLI commands
+    on the main thread may sign in through the browser (interactive=True).
+    """
+    global _credentials
+    with _lock:
+        if _credentials is None:
+            _credentials = _load_credentials(interactive)
+            logger.info("Loaded Google API credentials")
+    return _credentials
+
+def get_credentials():
+    """Credentials, loaded on first use; never opens the browser sign-in from a request or worker thread"""
+    if _credentials is None:
+        return load_credentials()
+    return _credentials
+
+def get_authorized_http():
+    """This thread's authorized keep-alive connection, shared by its Drive, Slides and Sheets clients"""
+    http = getattr(_thread_clients, "http", None)
+    if http is None:
+        http = AuthorizedHttp(get_credentials(), http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT_SECONDS))
+        _thread_clients.http = http
+        _thread_clients.services = {}
+    return http
+
+def get_service(api):
+    """
+    This thread's client for one of DRIVE, SLIDES or SHEETS, built on first use from
+    the discovery document bundled with google-api-python-client, so no discovery
+    fetch is needed. Clients must not be handed to other threads. Every request they
+    create is rate limited and retried per call (see google_rate_limit).
+    """
+    http = get_authorized_http()
+    service = _thread_clients.services.get(api)
+    if service is None:
+        name, version = api
+        service = build(
+            name, version, http=http, requestBuilder=RateLimitedHttpRequest,
+            static_discovery=True, cache_discovery=False
+        )
+        _thread_clients.services[api] = service
+    return service
+
+def get_drive_service():
+    return get_service(DRIVE)
+
+def get_slides_service():
+    return get_service(SLIDES)
+
+def get_sheets_service():
+    return get_service(SHEETS)
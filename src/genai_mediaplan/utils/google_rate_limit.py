@@ -0,0 +1,118 @@
+import os
+import random
+import threading
+import time
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Per-process request budgets, set just under the per-user Google quotas
+GOOGLE_SLIDES_WRITES_PER_MINUTE = float(os.getenv("GOOGLE_SLIDES_WRITES_PER_MINUTE", "55"))
+GOOGLE_SLIDES_READS_PER_MINUTE = float(os.getenv("GOOGLE_SLIDES_READS_PER_MINUTE", "550"))
+GOOGLE_SHEETS_WRITES_PER_MINUTE = float(os.getenv("GOOGLE_SHEETS_WRITES_PER_MINUTE", "55"))
+GOOGLE_SHEETS_READS_PER_MINUTE = float(os.getenv("GOOGLE_SHEETS_READS_PER_MINUTE", "55"))
+GOOGLE_DRIVE_REQUESTS_PER_MINUTE = float(os.getenv("GOOGLE_DRIVE_REQUESTS_PER_MINUTE", "600"))
+GOOGLE_API_MAX_RETRIES = int(os.getenv("GOOGLE_API_MAX_RETRIES", "6"))
+GOOGLE_API_BACKOFF_BASE_SECONDS = float(os.getenv("GOOGLE_API_BACKOFF_BASE_SECONDS", "1"))
+GOOGLE_API_BACKOFF_MAX_SECONDS = float(os.getenv("GOOGLE_API_BACKOFF_MAX_SECONDS", "64"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b"ratelimitexceeded", b"userratelimitexceeded", b"quotaexceeded")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+class TokenBucket:
+    """Allows `rate_per_minute` calls per minute with bursts of up to `capacity`"""
+
+    def __init__(self, name, rate_per_minute, capacity=None):
+        self.name = name
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity or max(1.0, rate_per_minute / 6)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take one token, sleeping until one is available. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait)
+            waited += wait
+
+buckets = {
+    ("slides", "write"): TokenBucket("slides writes", GOOGLE_SLIDES_WRITES_PER_MINUTE),
+    ("slides", "read"): TokenBucket("slides reads", GOOGLE_SLIDES_READS_PER_MINUTE),
+    ("sheets", "write"): TokenBucket("sheets writes", GOOGLE_SHEETS_WRITES_PER_MINUTE),
+    ("sheets", "read"): TokenBucket("sheets reads", GOOGLE_SHEETS_READS_PER_MINUTE),
+    ("drive", "write"): TokenBucket("drive requests", GOOGLE_DRIVE_REQUESTS_PER_MINUTE),
+}
+# Drive shares one budget for reads and writes
+buckets[("drive", "read")] = buckets[("drive", "write")]
+
+def get_bucket(method_id, http_method):
+    api = (method_id or "").split(".")[0]
+    kind = "write" if (http_method or "GET").upper() in WRITE_METHODS else "read"
+    return buckets.get((api, kind))
+
+def is_rate_limited(error):
+    status = error.resp.status
+    if status == 429:
+        return True
+    # Quota errors sometimes come back as 403 with a rate-limit reason
+    return status == 403 and any(reason in (error.content or b"").lower() for reason in RATE_LIMIT_REASONS)
+
+def is_retryable(error, http_method="GET"):
+    """
+    Reads are retried on rate limits and 5xx. Writes are not idempotent (a retried
+    files().copy can make a second copy), so they are only retried when the rate
+    limit guarantees the first attempt was rejected.
+    """
+    if is_rate_limited(error):
+        return True
+    return http_method not in WRITE_METHODS and error.resp.status in RETRYABLE_STATUSES
+
+def backoff_seconds(attempt, error=None):
+    """Full-jitter exponential backoff, or the server's Retry-After (capped) when it sends one"""
+    retry_after = error.resp.get("retry-after") if error is not None else None
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0.0), GOOGLE_API_BACKOFF_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(GOOGLE_API_BACKOFF_MAX_SECONDS, GOOGLE_API_BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+class RateLimitedHttpRequest(HttpRequest):
+    """
+    HttpRequest whose execute() waits for its API's token bucket and retries rate
+    limit responses (and 5xx for reads) with backoff, so a quota hit slows one call
+    down instead of failing the whole cohort.
+    """
+
+    def execute(self, http=None, num_retries=0):
+        bucket = get_bucket(self.methodId, self.method)
+        attempt = 0
+        while True:
+            if bucket is not None:
+                waited = bucket.acquire()
+                if waited > 1:
+                    logger.debug(f"Waited {waited:.1f}s for {bucket.name} budget before {self.methodId}")
+            try:
+                return super().execute(http=http, num_retries=0)
+            except HttpError as e:
+                if not is_retryable(e, self.method) or attempt >= GOOGLE_API_MAX_RETRIES:
+                    raise
+                delay = backoff_seconds(attempt, e)
+                attempt += 1
+                logger.warning(
+                    f"{self.methodId} returned {e.resp.status}, retry {attempt}/{GOOGLE_API_MAX_RETRIES} in {delay:.1f}s"
+                )
+                time.sleep(delay)
@@ -4,6 +4,41 @@ from genai_mediaplan.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Page element fields read by update_slides_content and update_requests_for_tablular_data_in_slides
+TEXT_ELEMENT_FIELDS = ("description", "shape.shapeType", "shape.text")
+TABLE_ELEMENT_FIELDS = ("description", "table")
+
+# Forecast preset -> label the deck uses for it in table alt texts and chart sheet titles
+FORECAST_PRESET_LABELS = {
+    "TIL_All_Cluster_RNF": "cluster",
+    "TIL_All_Languages_RNF": "language",
+    "TIL_TOI_Only_RNF": "TOI",
+    "TIL_ET_Only_RNF": "ET",
+    "TIL_ET_And_TOI_RNF": "combo",
+    "TIL_NBT_Only_RNF": "NBT",
+}
+
+def extract_json_from_text(content):
+    """
+    Extracts a JSON object or array from text that could either be:
+    1. Markdown with a ```json block
+    2. Raw JSON
+    """
+    # Try case 1: JSON block in markdown
+    match = re.search(r"```json\s*([\{\[].*?[\}\]])\s*```", content, re.DOTALL)
+    if match:
+        json_str = match.group(1)
+    else:
+        # Case 2: Try parsing the entire content as JSON
+        json_str = content
+
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error: {e}")
+        logger.error(f"Offending JSON string (truncated): {json_str[:300]}")
+        return None
+
 def extract_json_from_markdown_or_json(final_report_path):
     """
     Extracts a JSON object from a file that could either be:
@@ -20,31 +55,218 @@ def extract_json_from_markdown_or_json(final_report_path):
         logger.error(f"Error reading file: {e}")
         return None
 
-    # Try case 1: JSON block in markdown
-    match = re.search(r"```json\s*(\{.*?\})\s*```", content, re.DOTALL)
-    if match:
-        json_str = match.group(1)
-    else:
-        # Case 2: Try parsing the entire content as JSON
-        json_str = content
+    return extract_json_from_text(content)
 
-    try:
-        return json.loads(json_str)
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON decode error: {e}")
-        logger.error(f"Offending JSON string (truncated): {json_str[:300]}")
-        return None
+def find_object_id_by_alt_description(alt_text_index, alt_title):
+    entry = alt_text_index.first(alt_title)
+    return entry.object_id if entry else None
+
+def build_text_replacement_requests(entry, new_text):
+    """
+    Replace the text of an indexed shape, reapplying the original style of each line
+    and the first paragraph style.
+    """
+    object_id = entry.object_id
+    requests = []
 
-def find_object_id_by_alt_description(slides, alt_title):
-    for slide in slides:
-        for element in slide.get('pageElements', []):
-            title = element.get('description')
-            if title == alt_title:
-                return element['objectId']
-    return None
+    # Delete existing text
+    requests.append({
+        "deleteText": {
+            "objectId": object_id,
+            "textRange": {"type": "ALL"}
+        }
+    })
+
+    # Insert new text
+    requests.append({
+        "insertText": {
+            "objectId": object_id,
+            "insertionIndex": 0,
+            "text": new_text
+        }
+    })
+
+    # Reapply text styles per line
+    char_index = 0
+    new_lines = new_text.split('\n')
+
+    for i, line_text in enumerate(new_lines):
+        if i < len(entry.lines):
+            _, line_style = entry.lines[i]
+            if line_style and len(line_text) > 0:
+                requests.append({
+                    "updateTextStyle": {
+                        "objectId": object_id,
+                        "style": line_style,
+                        "textRange": {
+                            "type": "FIXED_RANGE",
+                            "startIndex": char_index,
+                            "endIndex": char_index + len(line_text)+1
+                        },
+                        "fields": ",".join(line_style.keys())
+                    }
+                })
+        char_index += len(line_text) + 1  # account for `\n`
+
+    # Reapply paragraph style (alignment)
+    if entry.paragraph_style:
+        requests.append({
+            "updateParagraphStyle": {
+                "objectId": object_id,
+                "style": entry.paragraph_style,
+                "textRange": {"type": "ALL"},
+                "fields": ",".join(entry.paragraph_style.keys())
+            }
+        })
+
+    return requests
 
 def format_reach_impr(user, impr):
     return (
         f"{round(user, 2)}M\nUser Reach",
         f"{round(min(user * 3, impr), 2)}M\nTargetable Impressions"
-    )
\ No newline at end of file
+    )
+
+def get_table_cell_text(table_element, row_index, col_index):
+    """Current text of a table cell without the trailing paragraph newline"""
+    cell = table_element["tableRows"][row_index]["tableCells"][col_index]
+    text_elements = cell.get("text", {}).get("textElements", [])
+    content = "".join(el["textRun"].get("content", "") for el in text_elements if "textRun" in el)
+    return content[:-1] if content.endswith("\n") else content
+
+def replace_table_cell_text(table_element, table_object_id, row_index, col_index, new_text):
+    """Requests replacing a table cell's text; none when the cell already holds `new_text`"""
+    if get_table_cell_text(table_element, row_index, col_index) == new_text:
+        return []
+
+    cell = table_element["tableRows"][row_index]["tableCells"][col_index]
+    text_elements = cell.get("text", {}).get("textElements", [])
+
+    # Estimate endIndex for deleteText
+    end_index = 0
+    for el in text_elements:
+        end_index = max(end_index, el.get("endIndex", 0))
+
+    requests = []
+
+    if end_index > 1:
+        requests.append({
+            "deleteText": {
+                "objectId": table_object_id,
+                "cellLocation": {
+                    "rowIndex": row_index,
+                    "columnIndex": col_index
+                },
+                "textRange": {
+                    "type": "FIXED_RANGE",
+                    "startIndex": 0,
+                    "endIndex": end_index-1
+                }
+            }
+        })
+    # Step 2: Insert new text at index 0
+    if new_text:
+        requests.append({
+            "insertText": {
+                "objectId": table_object_id,
+                "cellLocation": {
+                    "rowIndex": row_index,
+                    "columnIndex": col_index
+                },
+                "insertionIndex": 0,
+                "text": new_text
+            }
+        })
+    return requests
+
+def update_slides_content(snapshot, data):
+    requests = []
+    index = snapshot.alt_text_index
+    index.report_unmatched(data.keys(), kind='shape')
+    index.report_duplicates(data.keys(), kind='shape')
+
+    for alt_text, value in data.items():
+        for entry in index.get(alt_text, kind='shape'):
+            if not entry.text_elements:
+                continue
+            # should include `\n` if multi-line
+            requests.extend(build_text_replacement_requests(entry, str(value)))
+
+    return requests
+
+def update_requests_for_tablular_data_in_slides(snapshot, data_rows, table_alt_text):
+    requests = []
+
+    for entry in snapshot.alt_text_index.get(table_alt_text, kind='table'):
+        cells_touched = 0
+        cell_count = 0
+        logger.info(f"Found table with alt_text: {table_alt_text}")
+        for row in range(len(data_rows)):
+            for col in range(len(data_rows[row])):
+                cell_requests = replace_table_cell_text(entry.table, entry.object_id, row+1, col, data_rows[row][col])
+                cell_count += 1
+                if cell_requests:
+                    cells_touched += 1
+                    requests.extend(cell_requests)
+        logger.info(f"Table {table_alt_text}: {cells_touched} of {cell_count} cells changed")
+
+    return requests
+
+def get_tabular_data_for_forecast_tables(preset_name, audience_forecast):
+    
+    city_groups = ["Tier1 Cities", "Tier2 Cities", "Tier3", "Top 8 Metro Cities", "Top 10 Cities"]
+    states = ["Maharashtra", "Karnataka", "Telangana", "Tamil Nadu", "Andhra Pradesh"]
+    cities = ["Bengaluru", "Delhi", "Mumbai", "Pune", "Hyderabad", "Nagpur", "Ahmedabad", "Vadodara", "Jaipur", "Chandigarh", "Indore","Lucknow","Kolkata","Chennai","Coimbatore","Kochi"]
+    countries = ["India", "United States", "GCC", "Canada", "United Arab Emirates"]
+    
+    forecast_data = audience_forecast[preset_name]
+    
+    country_tier_state_data = []
+    
+    country_tier_state_data.append(["Countries", "", ""])
+    for country in countries:
+        entry = forecast_data.get(country)
+        if entry:
+            fcap_1 = round(entry["user"], 2)
+            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
+            country_tier_state_data.append([country, str(fcap_1), str(fcap_3)])
+            
+    country_tier_state_data.append(["Geographic Tiers", "", ""])
+    for city_group in city_groups:
+        entry = forecast_data.get(city_group)
+        if entry:
+            fcap_1 = round(entry["user"], 2)
+            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
+            country_tier_state_data.append([city_group, str(fcap_1), str(fcap_3)])
+            
+    country_tier_state_data.append(["State", "", ""])
+    for state in states:
+        entry = forecast_data.get(state)
+        if entry:
+            fcap_1 = round(entry["user"], 2)
+            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
+            country_tier_state_data.append([state, str(fcap_1), str(fcap_3)])
+            
+    city_data = []
+            
+    city_data.append(["Cities", "", ""])
+    for city in cities:
+        entry = forecast_data.get(city)
+        if entry:
+            fcap_1 = round(entry["user"], 2)
+            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
+            city_data.append([city, str(fcap_1), str(fcap_3)])
+            
+    return country_tier_state_data, city_data
+
+def get_update_requests_for_numerical_data_in_slides(snapshot, audience_forecast):
+    final_requests = []
+    table_alt_texts = [f"{label}_{table}" for label in FORECAST_PRESET_LABELS.values() for table in ("country_tier_state", "city")]
+    snapshot.alt_text_index.report_unmatched(table_alt_texts, kind='table')
+    snapshot.alt_text_index.report_duplicates(table_alt_texts, kind='table')
+    for preset, label in FORECAST_PRESET_LABELS.items():
+        country_tier_state_data, city_data= get_tabular_data_for_forecast_tables(preset, audience_forecast)
+        country_tier_state_requests = update_requests_for_tablular_data_in_slides(snapshot, country_tier_state_data, f"{label}_country_tier_state")
+        city_requests = update_requests_for_tablular_data_in_slides(snapshot, city_data, f"{label}_city")
+        final_requests.extend(country_tier_state_requests + city_requests)
+    return final_requests
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pydantic import PrivateAttr
+from crewai import Agent
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+LLM_CACHE_MAX_AGE_SECONDS = float(os.getenv("LLM_CACHE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+class TaskOutputCache:
+    """SQLite store of agent outputs keyed by a hash of everything that shaped the prompt"""
+
+    def __init__(self, path=LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, max_age_seconds=LLM_CACHE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_outputs ("
+                "key TEXT PRIMARY KEY, task_name TEXT, output TEXT, "
+                "created_at REAL, last_used_at REAL)"
+            )
+
+    def _connect(self):
+        # One short-lived connection per call; crew tasks run on several threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT output, created_at FROM task_outputs WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            output, created_at = row
+            if now - created_at > self.max_age_seconds:
+                conn.execute("DELETE FROM task_outputs WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE task_outputs SET last_used_at = ? WHERE key = ?", (now, key))
+            return output
+
+    def put(self, key, task_name, output):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO task_outputs (key, task_name, output, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, task_name, output, now, now)
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM task_outputs WHERE created_at < ?", (now - self.max_age_seconds,))
+        conn.execute(
+            "DELETE FROM task_outputs WHERE key NOT IN "
+            "(SELECT key FROM task_outputs ORDER BY last_used_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+    def delete(self, keys):
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM task_outputs WHERE key = ?", [(key,) for key in keys])
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM task_outputs")
+
+_task_output_cache = None
+_task_output_cache_lock = threading.Lock()
+
+def get_task_output_cache():
+    global _task_output_cache
+    if _task_output_cache is None:
+        with _task_output_cache_lock:
+            if _task_output_cache is None:
+                _task_output_cache = TaskOutputCache()
+    return _task_output_cache
+
+def task_cache_key(agent, task, context):
+    """
+    Hash of the task name, its rendered prompt, the agent's configuration and model and
+    the upstream context. Editing a task's prompt changes its key, and through its new
+    output the context and keys of the tasks downstream of it; other tasks still hit.
+    """
+    llm = agent.llm
+    payload = {
+        "task": task.name,
+        "prompt": task.prompt(),
+        "agent": {
+            "role": agent.role,
+            "goal": agent.goal,
+            "backstory": agent.backstory
+        },
+        "model": getattr(llm, "model", None) or str(llm),
+        "context": context or ""
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+class CachedAgent(Agent):
+    """
+    Agent that replays a stored output instead of calling the LLM when the task inputs
+    are unchanged. Set `use_output_cache` to False to always call the model (the fresh
+    output is still stored), and call `evict_cached_outputs()` with the tasks whose outputs
+    turned out to be unusable so the next run does not replay them.
+    """
+
+    use_output_cache: bool = True
+    _cache_keys: dict = PrivateAttr(default_factory=dict)
+
+    def execute_task(self, task, context=None, tools=None):
+        if not LLM_CACHE_ENABLED:
+            return super().execute_task(task, context=context, tools=tools)
+
+        cache = get_task_output_cache()
+        key = task_cache_key(self, task, context)
+        self._cache_keys[task.name] = key
+        if self.use_output_cache:
+            cached_output = cache.get(key)
+            if cached_output is not None:
+                logger.info(f"LLM cache hit for {task.name}, skipping the model call")
+                return cached_output
+
+        output = super().execute_task(task, context=context, tools=tools)
+        cache.put(key, task.name, output)
+        return output
+
+    def evict_cached_outputs(self, task_names=None):
+        """Drop the stored outputs of the tasks this agent ran, or only of `task_names`"""
+        if not LLM_CACHE_ENABLED:
+            return
+        evicted = [name for name in self._cache_keys if task_names is None or name in task_names]
+        if evicted:
+            get_task_output_cache().delete([self._cache_keys.pop(name) for name in evicted])
+            logger.info(f"Evicted cached outputs for {sorted(evicted)}")
@@ -0,0 +1,215 @@
+import re
+from pydantic import ValidationError
+from genai_mediaplan.mediaplan_schema import MediaplanOutput
+from genai_mediaplan.utils.helper import extract_json_from_text
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Limits and counts asked for by the task prompts in config/tasks.yaml
+COHORT_DEFINITION_MAX_CHARS = 450
+DATA_SIGNAL_CATEGORY_COUNT = 3
+DATA_SIGNAL_TITLE_MAX_CHARS = 40
+DATA_SIGNALS_PER_CATEGORY = 5
+DATA_SIGNAL_MAX_CHARS = 60
+PERSONA_COUNT = 6
+PERSONA_TITLE_MAX_CHARS = 35
+PERSONA_DESCRIPTION_MAX_CHARS = 85
+PERSONA_TARGET_PROFILE_COUNT = 4
+PERSONA_TARGET_PROFILES_MAX_CHARS = 130
+INSIGHT_COUNT = 4
+INSIGHT_TITLE_MAX_CHARS = 23
+INSIGHT_DESCRIPTION_MAX_CHARS = 235
+MARKET_EDGE_MAX_CHARS = 275
+RECOMMENDATION_COUNT = 4
+RECOMMENDATION_TITLE_MAX_CHARS = 100
+RECOMMENDATION_DESCRIPTION_MAX_CHARS = 245
+
+# Key of the final mediaplan each upstream task produces
+TASK_OUTPUT_KEYS = {
+    "definition_task": "cohort_definition",
+    "data_signals_task": "data_signals",
+    "persona_task": "personas",
+    "insight_task": "insights",
+    "market_edge_synthesizer_task": "market_edge",
+    "recommendation_task": "recommendations",
+}
+
+# Minimum number of items per list section; fewer than this needs a repair
+SECTION_COUNTS = {
+    "data_signals": DATA_SIGNAL_CATEGORY_COUNT,
+    "personas": PERSONA_COUNT,
+    "insights": INSIGHT_COUNT,
+    "recommendations": RECOMMENDATION_COUNT,
+}
+
+PARENTHETICAL_PATTERN = re.compile(r'\s*\([^)]*\)')
+
+def truncate_text(text, max_chars):
+    """Cut text to max_chars at a word boundary, dropping trailing punctuation"""
+    text = " ".join(str(text).split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars + 1]
+    if " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    else:
+        cut = cut[:max_chars]
+    return cut.rstrip(" ,;:-–—&(")
+
+def fit_target_profiles(profiles, max_total_chars):
+    """
+    Keep the target profiles within a combined character budget. Parenthetical
+    examples are dropped from the longest profiles first, then each profile is cut
+    to an equal share of the budget.
+    """
+    profiles = [" ".join(str(profile).split()) for profile in profiles]
+    while sum(len(profile) for profile in profiles) > max_total_chars:
+        candidates = [i for i, profile in enumerate(profiles) if PARENTHETICAL_PATTERN.search(profile)]
+        if not candidates:
+            break
+        longest = max(candidates, key=lambda i: len(profiles[i]))
+        profiles[longest] = PARENTHETICAL_PATTERN.sub("", profiles[longest]).strip()
+    if profiles and sum(len(profile) for profile in profiles) > max_total_chars:
+        share = max_total_chars // len(profiles)
+        profiles = [truncate_text(profile, share) for profile in profiles]
+    return profiles
+
+def parse_task_outputs(task_outputs):
+    """
+    Merge the raw outputs of the upstream tasks into one mediaplan dict.
+    Returns (mediaplan, problems) where problems lists the outputs that could not be used.
+    """
+    mediaplan = {}
+    problems = []
+    for task_name, key in TASK_OUTPUT_KEYS.items():
+        raw = task_outputs.get(task_name)
+        if raw is None:
+            problems.append(f"{task_name} produced no output")
+            continue
+        text = raw.strip()
+        if key not in SECTION_COUNTS and text and not text.startswith(("{", "`")):
+            # Plain-text answer for a single text field
+            mediaplan[key] = text
+            continue
+        parsed = extract_json_from_text(text)
+        if isinstance(parsed, dict) and key in parsed:
+            mediaplan[key] = parsed[key]
+        elif isinstance(parsed, list) and key in SECTION_COUNTS:
+            # Some prompts ask for "the JSON array" rather than the wrapping object
+            mediaplan[key] = parsed
+        else:
+            problems.append(f"{task_name} output has no '{key}'")
+    return mediaplan, problems
+
+def enforce_limits(mediaplan):
+    """Trim counts and text lengths to the limits in tasks.yaml. Returns the number of fields changed."""
+    repairs = 0
+
+    def fit(value, max_chars):
+        nonlocal repairs
+        if not isinstance(value, str):
+            return value
+        fitted = truncate_text(value, max_chars)
+        if fitted != value:
+            repairs += 1
+        return fitted
+
+    def cap(items, count):
+        nonlocal repairs
+        if isinstance(items, list) and len(items) > count:
+            repairs += 1
+            return items[:count]
+        return items
+
+    if "cohort_definition" in mediaplan:
+        mediaplan["cohort_definition"] = fit(mediaplan["cohort_definition"], COHORT_DEFINITION_MAX_CHARS)
+    if "market_edge" in mediaplan:
+        mediaplan["market_edge"] = fit(mediaplan["market_edge"], MARKET_EDGE_MAX_CHARS)
+
+    if "data_signals" in mediaplan:
+        mediaplan["data_signals"] = cap(mediaplan["data_signals"], DATA_SIGNAL_CATEGORY_COUNT)
+        for category in mediaplan["data_signals"] or []:
+            if not isinstance(category, dict):
+                continue
+            category["title"] = fit(category.get("title"), DATA_SIGNAL_TITLE_MAX_CHARS)
+            signals = cap(category.get("data_signals"), DATA_SIGNALS_PER_CATEGORY)
+            if isinstance(signals, list):
+                category["data_signals"] = [fit(signal, DATA_SIGNAL_MAX_CHARS) for signal in signals]
+
+    if "personas" in mediaplan:
+        mediaplan["personas"] = cap(mediaplan["personas"], PERSONA_COUNT)
+        for persona in mediaplan["personas"] or []:
+            if not isinstance(persona, dict):
+                continue
+            persona["title"] = fit(persona.get("title"), PERSONA_TITLE_MAX_CHARS)
+            persona["description"] = fit(persona.get("description"), PERSONA_DESCRIPTION_MAX_CHARS)
+            profiles = cap(persona.get("target_profiles"), PERSONA_TARGET_PROFILE_COUNT)
+            if isinstance(profiles, list):
+                fitted = fit_target_profiles(profiles, PERSONA_TARGET_PROFILES_MAX_CHARS)
+                if fitted != profiles:
+                    repairs += 1
+                persona["target_profiles"] = fitted
+
+    for key, title_max, description_max, count in (
+        ("insights", INSIGHT_TITLE_MAX_CHARS, INSIGHT_DESCRIPTION_MAX_CHARS, INSIGHT_COUNT),
+        ("recommendations", RECOMMENDATION_TITLE_MAX_CHARS, RECOMMENDATION_DESCRIPTION_MAX_CHARS, RECOMMENDATION_COUNT),
+    ):
+        if key not in mediaplan:
+            continue
+        mediaplan[key] = cap(mediaplan[key], count)
+        for item in mediaplan[key] or []:
+            if isinstance(item, dict):
+                item["title"] = fit(item.get("title"), title_max)
+                item["description"] = fit(item.get("description"), description_max)
+
+    return repairs
+
+def validate_mediaplan(mediaplan):
+    """Return (validated dict or None, list of problems that need an LLM repair)"""
+    problems = []
+    try:
+        validated = MediaplanOutput.model_validate(mediaplan).model_dump()
+    except ValidationError as e:
+        for error in e.errors():
+            location = ".".join(str(part) for part in error["loc"])
+            problems.append(f"{location}: {error['msg']}")
+        return None, problems
+    for key, count in SECTION_COUNTS.items():
+        if len(validated[key]) < count:
+            problems.append(f"{key}: expected {count} items, got {len(validated[key])}")
+    for index, category in enumerate(validated["data_signals"]):
+        if len(category["data_signals"]) < DATA_SIGNALS_PER_CATEGORY:
+            problems.append(f"data_signals.{index}: expected {DATA_SIGNALS_PER_CATEGORY} signals, got {len(category['data_signals'])}")
+    return validated, problems
+
+def problem_tasks(problems):
+    """
+    Names of the upstream tasks whose outputs caused the given problems. A problem that
+    cannot be traced to one section is blamed on every task.
+    """
+    tasks_by_key = {key: task_name for task_name, key in TASK_OUTPUT_KEYS.items()}
+    tasks = set()
+    for problem in problems:
+        head = re.split(r"[.: ]", problem, maxsplit=1)[0]
+        if head in TASK_OUTPUT_KEYS:
+            tasks.add(head)
+        elif head in tasks_by_key:
+            tasks.add(tasks_by_key[head])
+        else:
+            return set(TASK_OUTPUT_KEYS)
+    return tasks
+
+def assemble_mediaplan(task_outputs):
+    """
+    Build the final mediaplan from the upstream task outputs ({task name: raw text})
+    without an LLM call. Returns (mediaplan, problems); the mediaplan is ready for the
+    slides only when problems is empty.
+    """
+    mediaplan, problems = parse_task_outputs(task_outputs)
+    repairs = enforce_limits(mediaplan)
+    if repairs:
+        logger.info(f"Trimmed {repairs} mediaplan fields to the tasks.yaml limits")
+    validated, validation_problems = validate_mediaplan(mediaplan)
+    problems.extend(validation_problems)
+    return validated if validated is not None else mediaplan, problems
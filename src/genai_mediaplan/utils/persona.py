@@ -1,40 +1,32 @@
 import os
 from datetime import datetime
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from genai_mediaplan.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-def find_object_ids_by_alt_description(slides_service, presentation_id, slide_index):
-    presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
-    slides = presentation.get('slides', [])
+# Page element fields read by find_object_ids_by_alt_description. shape.shapeType keeps the
+# `shape` key in masked responses for boxes with no text, so they are still indexed as shapes.
+PERSONA_ELEMENT_FIELDS = ("description", "shape.shapeType", "shape.text")
+
+def find_object_ids_by_alt_description(snapshot, slide_index):
+    slides = snapshot.slides
     
     if slide_index >= len(slides):
         raise IndexError(f"Slide index {slide_index} out of range.")
     
-    slide_id = slides[slide_index]['objectId']
-    
-    response = slides_service.presentations().pages().get(
-        presentationId=presentation_id,
-        pageObjectId=slide_id
-    ).execute()
-    
-    elements = response.get('pageElements', [])
-    
     alt_descriptions=[f"persona_{i+1}" for i in range(6)]
     alt_descriptions.extend([f"persona_{i+1}_title" for i in range(6)])
     alt_descriptions.extend([f"persona_{i+1}_description" for i in range(6)])
     alt_descriptions.extend([f"persona_{i+1}_target_profiles" for i in range(6)])
     object_ids = {}
     styles = {}
-    for element in elements:
-        description = element.get('description')
-        if description in alt_descriptions:
-            object_ids[description] = element.get('objectId')
-            shape = element['shape']
+    # Both persona layouts carry the same alt-texts, so only take the ones on the kept slide
+    for description in alt_descriptions:
+        entry = next((e for e in snapshot.alt_text_index.get(description) if e.slide_index == slide_index), None)
+        if entry:
+            element = entry.element
+            object_ids[description] = entry.object_id
+            shape = element.get('shape', {})
             text_elements = shape.get('text', {}).get('textElements', [])
             text_style = {}
             para_style = {}
@@ -89,7 +81,8 @@ def find_object_ids_by_alt_description(slides_service, presentation_id, slide_in
 def utf16_len(text):
     return len(text.encode('utf-16-le')) // 2
 
-def update_textboxes(slides_service, presentation_id, textbox_ids, styles, desired_count, data):
+def update_textboxes(textbox_ids, styles, desired_count, data):
+    """Requests that fill the first `desired_count` persona boxes; the caller submits them"""
     requests = []
 
     for i in range(desired_count):
@@ -224,20 +217,16 @@ def update_textboxes(slides_service, presentation_id, textbox_ids, styles, desir
                 }
             })
 
-    # Execute batch request
-    slides_service.presentations().batchUpdate(
-        presentationId=presentation_id,
-        body={"requests": requests}
-    ).execute()
+    return requests
 
 
-def update_persona_content(slides_service, presentation_id, slide_index, data):
+def update_persona_content(snapshot, slide_index, data):
     desired_count = 6
     for i in range(6):
         if data.get(f"persona_{i+1}_title", "").strip() == "":
             desired_count = i
             break
-    textbox_ids, styles = find_object_ids_by_alt_description(slides_service, presentation_id, slide_index)
+    textbox_ids, styles = find_object_ids_by_alt_description(snapshot, slide_index)
     logger.info(f"desired_count: {desired_count}")
-    update_textboxes(slides_service, presentation_id, textbox_ids, styles, desired_count, data)
+    return update_textboxes(textbox_ids, styles, desired_count, data)
 
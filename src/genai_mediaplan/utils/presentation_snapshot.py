@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from genai_mediaplan.utils.alt_text_index import AltTextIndex
+from genai_mediaplan.utils.field_masks import get_presentation
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# How long a template deck's layout is reused before it is read again
+TEMPLATE_LAYOUT_TTL_SECONDS = float(os.getenv("TEMPLATE_LAYOUT_TTL_SECONDS", "600"))
+
+class PresentationSnapshot:
+    """Single read of a presentation shared by every request builder.
+
+    The deck is fetched lazily on first access and kept until `invalidate()`
+    is called, which writers do after a batchUpdate that changes the deck
+    structure (creating or deleting page elements or slides).
+
+    `fields` is the field mask for the read; callers build it from the page
+    element fields their builders declare (see field_masks.presentation_fields).
+    """
+
+    def __init__(self, slides_service, presentation_id, fields):
+        self.slides_service = slides_service
+        self.presentation_id = presentation_id
+        self.fields = fields
+        self._presentation = None
+        self._alt_text_index = None
+
+    @property
+    def presentation(self):
+        if self._presentation is None:
+            self.refresh()
+        return self._presentation
+
+    @property
+    def slides(self):
+        return self.presentation.get('slides', [])
+
+    @property
+    def alt_text_index(self):
+        if self._alt_text_index is None:
+            self._alt_text_index = AltTextIndex(self.slides)
+        return self._alt_text_index
+
+    def refresh(self):
+        """Fetch the presentation again"""
+        logger.debug(f"Fetching presentation {self.presentation_id}")
+        self._presentation = get_presentation(self.slides_service, self.presentation_id, self.fields)
+        self._alt_text_index = None
+        return self._presentation
+
+    def invalidate(self):
+        """Drop the cached presentation; the next access re-fetches it"""
+        self._presentation = None
+        self._alt_text_index = None
+
+    def for_copy(self, presentation_id, slides_service=None):
+        """
+        Snapshot of a Drive copy of this presentation that reuses this layout and
+        alt-text index instead of reading the copy; Drive copies keep page and
+        element object IDs. Writers still target the copy.
+        """
+        copy = PresentationSnapshot(slides_service or self.slides_service, presentation_id, self.fields)
+        copy._presentation = self.presentation
+        copy._alt_text_index = self.alt_text_index
+        return copy
+
+class TemplateLayoutCache:
+    """Snapshot of a template deck shared by every presentation copied from it"""
+
+    def __init__(self, presentation_id, fields, ttl_seconds=TEMPLATE_LAYOUT_TTL_SECONDS):
+        self.presentation_id = presentation_id
+        self.fields = fields
+        self.ttl_seconds = ttl_seconds
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, slides_service):
+        """The template's snapshot, read with slides_service when missing or expired"""
+        with self._lock:
+            if self._snapshot is None or time.monotonic() - self._loaded_at > self.ttl_seconds:
+                snapshot = PresentationSnapshot(slides_service, self.presentation_id, self.fields)
+                snapshot.refresh()
+                # Build the index once here rather than in every copy
+                snapshot.alt_text_index
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+                logger.info(f"Loaded template layout of {self.presentation_id} ({len(snapshot.slides)} slides)")
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
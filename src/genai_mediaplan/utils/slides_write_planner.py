@@ -0,0 +1,73 @@
+import json
+import os
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Slides rejects oversized batchUpdate bodies; stay well under the limits when splitting
+SLIDES_MAX_REQUESTS_PER_BATCH = int(os.getenv("SLIDES_MAX_REQUESTS_PER_BATCH", "1000"))
+SLIDES_MAX_BATCH_BYTES = int(os.getenv("SLIDES_MAX_BATCH_BYTES", str(4 * 1024 * 1024)))
+
+# Phases in the order they are submitted. Charts are recreated first and slides are
+# deleted last, so every text and table request still finds its target object.
+CHARTS = "charts"
+PERSONAS = "personas"
+TEXT = "text"
+TABLES = "tables"
+DELETIONS = "deletions"
+PHASES = (CHARTS, PERSONAS, TEXT, TABLES, DELETIONS)
+
+# Requests that create or delete page elements or slides, after which cached layouts are stale
+STRUCTURAL_REQUESTS = {"createSheetsChart", "deleteObject", "createSlide", "duplicateObject"}
+
+class SlidesWritePlanner:
+    """
+    Collects the Slides requests for one presentation from every builder and submits
+    them together, in phase order, in as few batchUpdates as the size limits allow.
+    """
+
+    def __init__(self, presentation_id):
+        self.presentation_id = presentation_id
+        self._requests = {phase: [] for phase in PHASES}
+
+    def add(self, phase, requests):
+        if phase not in self._requests:
+            raise ValueError(f"Unknown write phase '{phase}'")
+        self._requests[phase].extend(requests or [])
+
+    def requests(self):
+        return [request for phase in PHASES for request in self._requests[phase]]
+
+    def batches(self):
+        """Split the ordered requests into batchUpdate bodies within the count and size limits"""
+        batches = []
+        current = []
+        current_bytes = 0
+        for request in self.requests():
+            request_bytes = len(json.dumps(request))
+            if current and (len(current) >= SLIDES_MAX_REQUESTS_PER_BATCH or current_bytes + request_bytes > SLIDES_MAX_BATCH_BYTES):
+                batches.append(current)
+                current = []
+                current_bytes = 0
+            current.append(request)
+            current_bytes += request_bytes
+        if current:
+            batches.append(current)
+        return batches
+
+    def execute(self, slides_service, snapshot=None):
+        """
+        Submit the planned requests. `snapshot` is invalidated when they change the deck
+        structure. Returns the number of batchUpdates made.
+        """
+        batches = self.batches()
+        for requests in batches:
+            slides_service.presentations().batchUpdate(
+                presentationId=self.presentation_id,
+                body={"requests": requests}
+            ).execute()
+        if snapshot is not None and any(STRUCTURAL_REQUESTS & request.keys() for requests in batches for request in requests):
+            snapshot.invalidate()
+        counts = ", ".join(f"{phase}={len(self._requests[phase])}" for phase in PHASES if self._requests[phase])
+        logger.info(f"Applied {sum(len(b) for b in batches)} requests to {self.presentation_id} in {len(batches)} batchUpdate(s) ({counts or 'none'})")
+        return len(batches)
@@ -0,0 +1,238 @@
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from genai_mediaplan.jobs.job_store import get_job_store
+from genai_mediaplan.utils.google_clients import get_drive_service
+from genai_mediaplan.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Ready template deck + sheet pairs kept in the shared folder; 0 disables the pool
+TEMPLATE_POOL_SIZE = int(os.getenv("TEMPLATE_POOL_SIZE", "2"))
+TEMPLATE_POOL_REFILL_SECONDS = float(os.getenv("TEMPLATE_POOL_REFILL_SECONDS", "60"))
+# A ready copy whose partner is missing this long after creation is a failed refill
+TEMPLATE_POOL_ORPHAN_SECONDS = float(os.getenv("TEMPLATE_POOL_ORPHAN_SECONDS", "600"))
+
+# Drive appProperties that tag pooled copies
+POOL_STATE = "mediaplanPool"
+POOL_VERSION = "mediaplanPoolVersion"
+POOL_PAIR = "mediaplanPoolPair"
+POOL_ROLE = "mediaplanPoolRole"
+POOL_CLAIMED_BY = "mediaplanPoolClaimedBy"
+READY = "ready"
+CLAIMED = "claimed"
+DECK = "deck"
+SHEET = "sheet"
+# Job store lease held by the one process that refills the pool
+REFILL_LEASE = "template_pool_refill"
+REFILL_CLAIMANT = "refill"
+
+class TemplatePool:
+    """
+    Keeps `size` unclaimed copies of the template deck and chart sheet in the shared
+    folder, so generation can rename a ready pair instead of waiting on Drive copies.
+
+    Pooled copies are tagged in Drive appProperties with the template version they
+    were made from. Every process that starts the pool tracks the template version,
+    but only the holder of the refill lease in the job store refills it and deletes
+    ready copies of an older template version. A pair is taken through a claim row in
+    the job store before it is renamed or deleted, so no two processes on the host
+    ever both use or delete the same pair.
+    """
+
+    def __init__(self, deck_id, sheet_id, folder_id, size=TEMPLATE_POOL_SIZE, on_template_change=None):
+        self.deck_id = deck_id
+        self.sheet_id = sheet_id
+        self.folder_id = folder_id
+        self.size = size
+        self.on_template_change = on_template_change
+        self._template_version = None
+        self._holder = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.size > 0 and bool(self.deck_id and self.sheet_id and self.folder_id)
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._maintain, name="template-pool", daemon=True)
+        self._thread.start()
+        logger.info(f"Template pool started, keeping {self.size} ready copies")
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread = None
+        if self.enabled:
+            try:
+                get_job_store().release_lease(REFILL_LEASE, self._holder)
+            except Exception as e:
+                logger.warning(f"Could not release the template pool refill lease: {e}")
+
+    def notify(self):
+        """Wake the maintenance thread to top up the pool after a claim"""
+        self._wake.set()
+
+    def template_version(self):
+        """Drive version of the template pair; changes whenever either file is edited"""
+        drive_service = get_drive_service()
+        versions = [
+            drive_service.files().get(fileId=file_id, fields="version").execute()["version"]
+            for file_id in (self.deck_id, self.sheet_id)
+        ]
+        return "-".join(versions)
+
+    def _list_pooled(self):
+        drive_service = get_drive_service()
+        query = (
+            f"'{self.folder_id}' in parents and trashed = false and "
+            f"appProperties has {{ key='{POOL_STATE}' and value='{READY}' }}"
+        )
+        files = []
+        page_token = None
+        while True:
+            response = drive_service.files().list(
+                q=query,
+                fields="nextPageToken, files(id, createdTime, appProperties)",
+                pageToken=page_token
+            ).execute()
+            files.extend(response.get("files", []))
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return files
+
+    def _ready_pairs(self, files):
+        """pair ID -> {role: file} for the listed ready copies"""
+        pairs = {}
+        for file in files:
+            props = file.get("appProperties", {})
+            pairs.setdefault(props.get(POOL_PAIR), {})[props.get(POOL_ROLE)] = file
+        return pairs
+
+    def claim(self, deck_name, sheet_name):
+        """
+        Take a ready pair of the current template version and rename it. Returns
+        (deck_id, sheet_id), or None when the pool has nothing ready.
+        """
+        if not self.enabled or self._template_version is None:
+            return None
+        store = get_job_store()
+        claimant = uuid.uuid4().hex
+        try:
+            pairs = {
+                pair_id: pair for pair_id, pair in self._ready_pairs(self._list_pooled()).items()
+                if pair.get(DECK) and pair.get(SHEET)
+                and all(f["appProperties"].get(POOL_VERSION) == self._template_version for f in pair.values())
+            }
+            pair_id = store.claim_pool_pair(list(pairs), claimant)
+        except Exception as e:
+            logger.error(f"Error claiming a pooled template copy: {e}")
+            self.notify()
+            return None
+        if pair_id is None:
+            logger.info("Template pool is empty, copying the template instead")
+            self.notify()
+            return None
+
+        deck, sheet = pairs[pair_id][DECK], pairs[pair_id][SHEET]
+        drive_service = get_drive_service()
+        try:
+            for file, name in ((deck, deck_name), (sheet, sheet_name)):
+                drive_service.files().update(
+                    fileId=file["id"],
+                    body={"name": name, "appProperties": {POOL_STATE: CLAIMED, POOL_CLAIMED_BY: claimant}}
+                ).execute()
+        except Exception as e:
+            # Don't leave a half-renamed pair behind while the caller copies the template again
+            logger.error(f"Error claiming pooled template copy {deck['id']}, deleting the pair: {e}")
+            self._delete_files([deck, sheet])
+            return None
+        finally:
+            self.notify()
+        logger.info(f"Claimed pooled template copy {deck['id']}")
+        return deck["id"], sheet["id"]
+
+    def check_template_version(self):
+        """Re-read the template version and drop caches built from an older one"""
+        version = self.template_version()
+        if self._template_version is not None and version != self._template_version:
+            logger.info(f"Template changed to version {version}")
+            if self.on_template_change:
+                self.on_template_change()
+        self._template_version = version
+        return version
+
+    def refill(self):
+        """
+        Delete stale and orphaned ready copies, then copy the template until `size`
+        pairs are ready. Only call this while holding the refill lease.
+        """
+        version = self._template_version
+        store = get_job_store()
+        store.evict_pool_claims(TEMPLATE_POOL_ORPHAN_SECONDS)
+        orphan_before = datetime.now(timezone.utc) - timedelta(seconds=TEMPLATE_POOL_ORPHAN_SECONDS)
+        pairs = self._ready_pairs(self._list_pooled())
+        # Read after listing, so a pair a claim is halfway through renaming is never mistaken for an orphan
+        claimed = store.claimed_pool_pairs()
+        ready = 0
+        for pair_id, pair in pairs.items():
+            if pair_id in claimed:
+                continue
+            stale = any(f["appProperties"].get(POOL_VERSION) != version for f in pair.values())
+            orphaned = len(pair) < 2 and all(
+                datetime.fromisoformat(f["createdTime"].replace("Z", "+00:00")) < orphan_before for f in pair.values()
+            )
+            if stale or orphaned:
+                # Take the pair like a claim does, so a generation cannot claim it while it is deleted
+                if store.claim_pool_pair([pair_id], REFILL_CLAIMANT) is None:
+                    continue
+                self._delete_files(pair.values())
+                logger.info(f"Deleted {'stale' if stale else 'orphaned'} pooled template copy {[f['id'] for f in pair.values()]}")
+            elif len(pair) == 2:
+                ready += 1
+
+        for _ in range(self.size - ready):
+            self._copy_pair(version)
+        if ready < self.size:
+            logger.info(f"Template pool refilled with {self.size - ready} pair(s)")
+
+    def _delete_files(self, files):
+        drive_service = get_drive_service()
+        for file in files:
+            try:
+                drive_service.files().delete(fileId=file["id"]).execute()
+            except Exception as e:
+                logger.warning(f"Could not delete pooled template copy {file['id']}: {e}")
+
+    def _copy_pair(self, version):
+        drive_service = get_drive_service()
+        pair_id = uuid.uuid4().hex
+        for role, file_id in ((DECK, self.deck_id), (SHEET, self.sheet_id)):
+            drive_service.files().copy(
+                fileId=file_id,
+                body={
+                    "name": f"MediaplanTemplatePool_{role}_{pair_id}",
+                    "parents": [self.folder_id],
+                    "appProperties": {POOL_STATE: READY, POOL_VERSION: version, POOL_PAIR: pair_id, POOL_ROLE: role}
+                },
+                fields="id"
+            ).execute()
+
+    def _maintain(self):
+        while not self._stop.is_set():
+            try:
+                self.check_template_version()
+                # Every process claims from the pool, but only one keeps it filled
+                if get_job_store().acquire_lease(REFILL_LEASE, self._holder, TEMPLATE_POOL_REFILL_SECONDS * 3):
+                    self.refill()
+            except Exception as e:
+                logger.error(f"Error refilling template pool: {e}")
+            self._wake.wait(TEMPLATE_POOL_REFILL_SECONDS)
+            self._wake.clear()
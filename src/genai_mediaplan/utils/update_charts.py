@@ -1,35 +1,143 @@
 import os
+import threading
+import time
 from datetime import datetime
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
 from genai_mediaplan.utils.logger import get_logger
+from genai_mediaplan.utils.field_masks import get_spreadsheet
 
 logger = get_logger(__name__)
 
-def get_chart_ids(copied_sheet_id, sheets_service):
-    response = sheets_service.spreadsheets().get(
-        spreadsheetId=copied_sheet_id,
-        includeGridData=False
-    ).execute()
-    chart_map = {}
+# Page element fields read by update_charts_preserving_position
+CHART_ELEMENT_FIELDS = ("sheetsChart", "transform", "size")
+# Chart IDs plus the source ranges of each chart's domain and first series
+CHART_SPREADSHEET_FIELDS = (
+    "sheets(properties(sheetId,title,gridProperties.rowCount),charts(chartId,spec("
+    "basicChart(headerCount,domains.domain.sourceRange,series.series.sourceRange),"
+    "pieChart(domain.sourceRange,series.sourceRange))))"
+)
+# How long a spreadsheet's sheet -> chart ID mapping is reused before it is read again
+CHART_ID_CACHE_TTL_SECONDS = float(os.getenv("CHART_ID_CACHE_TTL_SECONDS", "600"))
+
+class ChartSeriesError(Exception):
+    """Raised when a forecast series cannot be matched to the charts of a workbook"""
+
+def column_letter(index):
+    """0-based column index -> A1 column letters"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+def get_chart_source(spec, sheet_properties):
+    """
+    {"domain": ..., "series": ...} cell columns a chart reads its labels and values
+    from, each as {"title", "column", "first_row", "last_row"} in A1 numbering, or
+    None for charts with another layout. sheet_properties maps sheet ID -> sheet
+    properties; an unbounded range ends at the last row of its sheet.
+    """
+    if "basicChart" in spec:
+        chart = spec["basicChart"]
+        header_count = chart.get("headerCount", 0)
+        domains, series = chart.get("domains", []), chart.get("series", [])
+        domain = domains[0].get("domain", {}) if domains else {}
+        values = series[0].get("series", {}) if series else {}
+    elif "pieChart" in spec:
+        chart = spec["pieChart"]
+        header_count = 0
+        domain, values = chart.get("domain", {}), chart.get("series", {})
+    else:
+        return None
+    source = {}
+    for role, data in (("domain", domain), ("series", values)):
+        ranges = data.get("sourceRange", {}).get("sources", [])
+        if not ranges:
+            return None
+        grid = ranges[0]
+        properties = sheet_properties.get(grid.get("sheetId", 0), {})
+        source[role] = {
+            "title": properties.get("title"),
+            "column": column_letter(grid.get("startColumnIndex", 0)),
+            "first_row": grid.get("startRowIndex", 0) + header_count + 1,
+            "last_row": grid.get("endRowIndex", properties.get("gridProperties", {}).get("rowCount", 1000)),
+        }
+    return source
+
+def get_chart_layout(spreadsheet_id, sheets_service):
+    """Sheet title -> chart ID, and sheet title -> source columns of that chart (see get_chart_source)"""
+    response = get_spreadsheet(sheets_service, spreadsheet_id, CHART_SPREADSHEET_FIELDS)
     sheets = response.get('sheets', [])
+    sheet_properties = {sheet['properties'].get('sheetId', 0): sheet['properties'] for sheet in sheets}
+    chart_map = {}
+    sources = {}
     for sheet in sheets:
         sheet_title = sheet['properties']['title']
-        charts = sheet.get('charts', [])
-        if charts:
-            for chart in charts:
-                chart_map[sheet_title] = chart['chartId']
-    return chart_map
+        for chart in sheet.get('charts', []):
+            chart_map[sheet_title] = chart['chartId']
+            source = get_chart_source(chart.get('spec', {}), sheet_properties)
+            if source:
+                sources[sheet_title] = source
+            else:
+                sources.pop(sheet_title, None)
+    return chart_map, sources
+
+def get_chart_ids(copied_sheet_id, sheets_service):
+    return get_chart_layout(copied_sheet_id, sheets_service)[0]
+
+class ChartIdCache:
+    """
+    Sheet title -> chart ID mappings, and the cells each chart reads, per spreadsheet.
+    Drive copies keep chart IDs, so the template sheet's mapping also serves every
+    copy made from it.
+    """
+
+    def __init__(self, ttl_seconds=CHART_ID_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._chart_maps = {}
+        self._lock = threading.Lock()
+
+    def _layout(self, spreadsheet_id, sheets_service):
+        with self._lock:
+            cached = self._chart_maps.get(spreadsheet_id)
+            if cached and time.monotonic() - cached[1] <= self.ttl_seconds:
+                return cached[0]
+        layout = get_chart_layout(spreadsheet_id, sheets_service)
+        with self._lock:
+            self._chart_maps[spreadsheet_id] = (layout, time.monotonic())
+        return layout
+
+    def get(self, spreadsheet_id, sheets_service):
+        return self._layout(spreadsheet_id, sheets_service)[0]
+
+    def get_sources(self, spreadsheet_id, sheets_service):
+        return self._layout(spreadsheet_id, sheets_service)[1]
+
+    def invalidate(self, spreadsheet_id=None):
+        with self._lock:
+            if spreadsheet_id is None:
+                self._chart_maps.clear()
+            else:
+                self._chart_maps.pop(spreadsheet_id, None)
 
-def update_charts_preserving_position(copied_slide_id, slides_service, copied_sheet_id, chart_map, target_slide_index=1):
-    presentation = slides_service.presentations().get(presentationId=copied_slide_id).execute()
-    slides = presentation.get('slides')
+chart_id_cache = ChartIdCache()
+
+def get_slide_chart_elements(snapshot, target_slide_index):
+    slides = snapshot.slides
+    if target_slide_index >= len(slides):
+        return []
+    return [element for element in slides[target_slide_index].get('pageElements', []) if 'sheetsChart' in element]
+
+def update_charts_preserving_position(snapshot, copied_sheet_id, chart_map, target_slide_index=1):
+    """
+    Requests that point the slide's charts at `copied_sheet_id`, in place; the caller
+    submits them. Charts already linked to that chart are refreshed, others are recreated.
+    """
+    slides = snapshot.slides
 
     if target_slide_index >= len(slides):
         logger.error(f"Slide index {target_slide_index} does not exist in presentation.")
-        return
+        return []
 
     target_slide = slides[target_slide_index]
     page_id = target_slide['objectId']
@@ -41,6 +149,7 @@ def update_charts_preserving_position(copied_slide_id, slides_service, copied_sh
         if 'sheetsChart' in element:
             chart_elements.append({
                 'objectId': element['objectId'],
+                'sheetsChart': element['sheetsChart'],
                 'transform': element['transform'],
                 'size': element.get('size', {
                     'height': {'magnitude': 250, 'unit': 'PT'},
@@ -50,10 +159,20 @@ def update_charts_preserving_position(copied_slide_id, slides_service, copied_sh
 
     if not chart_elements:
         logger.error("No existing charts to replace.")
-        return
+        return []
 
-    # Step 2: Replace charts using saved positions
+    # Step 2: Refresh charts that are already linked, replace the rest using saved positions
+    refreshed = 0
     for (sheet_name, chart_id), chart_info in zip(chart_map.items(), chart_elements):
+        linked = chart_info['sheetsChart']
+        if linked.get('spreadsheetId') == copied_sheet_id and linked.get('chartId') == chart_id:
+            requests.append({
+                'refreshSheetsChart': {
+                    'objectId': chart_info['objectId']
+                }
+            })
+            refreshed += 1
+            continue
         requests.append({
             'deleteObject': {
                 'objectId': chart_info['objectId']
@@ -72,25 +191,58 @@ def update_charts_preserving_position(copied_slide_id, slides_service, copied_sh
             }
         })
 
-    # Step 3: Execute batch update
     if requests:
-        slides_service.presentations().batchUpdate(
-            presentationId=copied_slide_id,
-            body={'requests': requests}
-        ).execute()
-        logger.info(f"{len(requests)//2} charts replaced in slide {target_slide_index + 1}.")
+        logger.info(f"{refreshed} charts to refresh and {(len(requests) - refreshed)//2} to replace in slide {target_slide_index + 1}.")
     else:
         logger.error("No charts replaced.")
+    return requests
         
+def a1_column_range(column_source):
+    title = column_source["title"].replace("'", "''")
+    return f"'{title}'!{column_source['column']}{column_source['first_row']}:{column_source['column']}{column_source['last_row']}"
+
+def read_chart_labels(spreadsheet_id, sheets_service, sources):
+    """Sheet title -> the labels currently in that sheet's chart domain, one per row"""
+    titles = list(sources)
+    if not titles:
+        return {}
+    response = sheets_service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[a1_column_range(sources[title]["domain"]) for title in titles]
+    ).execute()
+    return {
+        title: [str(row[0]).strip() if row else "" for row in value_range.get("values", [])]
+        for title, value_range in zip(titles, response.get("valueRanges", []))
+    }
+
 def update_chart_data_in_sheets(spreadsheet_id, sheets_service, chart_data):
-    requests = []
+    """
+    Write `chart_data` (sheet title -> {label: value}) into the series cells each sheet's
+    chart reads, as found in the chart specs, in one values batchUpdate. Values follow
+    the labels already in the chart's domain; a label with no value is left blank, and
+    the range is written to its end so a shorter series leaves no stale rows.
 
-    for sheet_name, values in chart_data.items():
-        range_notation = f"{sheet_name}!A2:B{len(values) + 1}"
+    Raises ChartSeriesError when a sheet has no chart or none of its labels has a value.
+    """
+    sources = chart_id_cache.get_sources(spreadsheet_id, sheets_service)
+    missing = sorted(set(chart_data) - set(sources))
+    if missing:
+        raise ChartSeriesError(f"No chart source range on sheet(s) {missing} of workbook {spreadsheet_id}")
+    labels_by_sheet = read_chart_labels(spreadsheet_id, sheets_service, {title: sources[title] for title in chart_data})
+    requests = []
 
+    for sheet_name, series in chart_data.items():
+        labels = labels_by_sheet.get(sheet_name, [])
+        if not any(label in series for label in labels):
+            raise ChartSeriesError(
+                f"None of the chart labels {labels} on sheet {sheet_name} of workbook {spreadsheet_id} are in the forecast"
+            )
+        column_source = sources[sheet_name]["series"]
+        capacity = max(column_source["last_row"] - column_source["first_row"] + 1, 0)
+        values = [[series.get(label, "")] for label in labels][:capacity]
         requests.append({
-            "range": range_notation,
-            "values": values
+            "range": a1_column_range(column_source),
+            "values": values + [[""]] * (capacity - len(values))
         })
 
     if not requests:
@@ -107,12 +259,59 @@ def update_chart_data_in_sheets(spreadsheet_id, sheets_service, chart_data):
         body=body
     ).execute()
 
-    logger.info(f"Updated data in {len(chart_data)} sheet(s): {list(chart_data.keys())}")
+    logger.info(f"Updated data in {len(requests)} sheet(s): {list(chart_data)}")
     
-def update_charts_in_slides(copied_slide_id, slides_service, copied_sheet_id, sheets_service, target_slide_index, chart_data=None):
-    chart_ids_map = get_chart_ids(copied_sheet_id, sheets_service)
-    update_charts_preserving_position(copied_slide_id, slides_service, copied_sheet_id, chart_ids_map, target_slide_index)
+def get_linked_spreadsheet_id(snapshot):
+    """ID of the workbook the deck's charts link to, or None when the deck has no linked charts"""
+    for slide in snapshot.slides:
+        for element in slide.get('pageElements', []):
+            spreadsheet_id = element.get('sheetsChart', {}).get('spreadsheetId')
+            if spreadsheet_id:
+                return spreadsheet_id
+    return None
+
+def refresh_chart_data(snapshot, spreadsheet_id, sheets_service, chart_series):
+    """
+    Write `chart_series` (sheet title -> {label: value}) to the cells the workbook's
+    charts read and return the refreshSheetsChart requests for every chart in the deck
+    linked to it. Raises ChartSeriesError when a series has no chart in the deck to go
+    to, rather than skipping it silently.
+    """
+    linked_elements = [
+        element
+        for slide in snapshot.slides
+        for element in slide.get('pageElements', [])
+        if element.get('sheetsChart', {}).get('spreadsheetId') == spreadsheet_id
+    ]
+    linked_chart_ids = {element['sheetsChart'].get('chartId') for element in linked_elements}
+    chart_map = chart_id_cache.get(spreadsheet_id, sheets_service)
+    linked_sheets = {title for title, chart_id in chart_map.items() if chart_id in linked_chart_ids}
+    missing = sorted(set(chart_series) - linked_sheets)
+    if missing:
+        raise ChartSeriesError(
+            f"The deck links no chart on sheet(s) {missing} of workbook {spreadsheet_id}; "
+            f"its linked charts are on {sorted(linked_sheets)}"
+        )
+    update_chart_data_in_sheets(spreadsheet_id, sheets_service, chart_series)
+    return [{'refreshSheetsChart': {'objectId': element['objectId']}} for element in linked_elements]
+
+def update_charts_in_slides(snapshot, copied_sheet_id, sheets_service, target_slide_index, chart_data=None, template_sheet_id=None):
+    """
+    Write `chart_data` (see update_chart_data_in_sheets) to the sheet and return the
+    Slides requests that relink its charts.
+    The chart IDs come from the cache, keyed by `template_sheet_id` when the sheet is a
+    copy of it, and are read again when a chart on the slide links to an unknown ID.
+    """
+    chart_ids_key = template_sheet_id or copied_sheet_id
+    chart_ids_map = chart_id_cache.get(chart_ids_key, sheets_service)
+    known_chart_ids = set(chart_ids_map.values())
+    if any(element['sheetsChart'].get('spreadsheetId') == copied_sheet_id and element['sheetsChart'].get('chartId') not in known_chart_ids
+           for element in get_slide_chart_elements(snapshot, target_slide_index)):
+        logger.info(f"Cached chart IDs for {chart_ids_key} are stale, reading them again")
+        chart_id_cache.invalidate(chart_ids_key)
+        chart_ids_map = chart_id_cache.get(chart_ids_key, sheets_service)
     if chart_data:
         update_chart_data_in_sheets(copied_sheet_id, sheets_service, chart_data)
+    return update_charts_preserving_position(snapshot, copied_sheet_id, chart_ids_map, target_slide_index)
     
     
\ No newline at end of file
@@ -2,48 +2,50 @@ import json
 import unicodedata
 import regex
 # from google.oauth2 import service_account
-from googleapiclient.discovery import build
 from datetime import datetime
 import os
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from genai_mediaplan.utils.update_charts import update_charts_in_slides
-from genai_mediaplan.utils.persona import update_persona_content
+from concurrent.futures import Future, ThreadPoolExecutor
+from genai_mediaplan.utils.update_charts import update_charts_in_slides, chart_id_cache, CHART_ELEMENT_FIELDS
+from genai_mediaplan.utils.persona import update_persona_content, PERSONA_ELEMENT_FIELDS
 from genai_mediaplan.utils.logger import get_logger
-from genai_mediaplan.utils.helper import format_reach_impr
+from genai_mediaplan.utils.helper import (
+    format_reach_impr, update_slides_content, get_update_requests_for_numerical_data_in_slides,
+    TEXT_ELEMENT_FIELDS, TABLE_ELEMENT_FIELDS
+)
+from genai_mediaplan.utils.presentation_snapshot import PresentationSnapshot, TemplateLayoutCache
+from genai_mediaplan.utils.template_pool import TemplatePool
+from genai_mediaplan.utils.slides_write_planner import SlidesWritePlanner, CHARTS, PERSONAS, TEXT, TABLES, DELETIONS
+from genai_mediaplan.utils.field_masks import presentation_fields
+from genai_mediaplan.utils.google_clients import get_drive_service, get_slides_service, get_sheets_service
 
 logger = get_logger(__name__)
 
-# Set up credentials
-# SERVICE_ACCOUNT_FILE = 'service_account.json'
-SCOPES = ['https://www.googleapis.com/auth/drive']
-CLIENT_SECRET_FILE = 'client_secret_drive.json'
-TOKEN_FILE = 'token.json'
 SOURCE_FILE_ID = os.getenv("SOURCE_FILE_ID")
 SOURCE_SHEET_ID = os.getenv("SOURCE_SHEET_ID")
 SHARED_FOLDER_ID = os.getenv("SHARED_FOLDER_ID")
+# Build requests from the cached template layout instead of reading every copy
+TEMPLATE_LAYOUT_CACHE_ENABLED = os.getenv("TEMPLATE_LAYOUT_CACHE_ENABLED", "true").lower() == "true"
+# Threads for the template deck and sheet copies; each keeps its own warm Drive connection
+DRIVE_COPY_MAX_WORKERS = int(os.getenv("DRIVE_COPY_MAX_WORKERS", "4"))
 
 CHART_SLIDE_INDEX = 4
 PERSONA_SLIDE_INDEX_4 = 6
 PERSONA_SLIDE_INDEX_6 = 7
 
-creds = None
-if os.path.exists(TOKEN_FILE):
-    creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
-if not creds or not creds.valid:
-    if creds and creds.expired and creds.refresh_token:
-        creds.refresh(Request())
-    else:
-        flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
-        creds = flow.run_local_server(port=0)
-    # Save token for future use
-    with open(TOKEN_FILE, 'w') as token:
-        token.write(creds.to_json())
-        
-drive_service = build('drive', 'v3', credentials=creds)
-slides_service = build('slides', 'v1', credentials=creds)
-sheets_service = build('sheets', 'v4', credentials=creds)
+# Text and table fields of the shared builders in helper, plus persona and chart fields;
+# delete_slides_requests only needs slide object IDs, which every field mask includes
+PRESENTATION_FIELDS = presentation_fields(
+    *TEXT_ELEMENT_FIELDS, *TABLE_ELEMENT_FIELDS, *PERSONA_ELEMENT_FIELDS, *CHART_ELEMENT_FIELDS
+)
+
+template_layout_cache = TemplateLayoutCache(SOURCE_FILE_ID, PRESENTATION_FIELDS)
+drive_copy_executor = ThreadPoolExecutor(max_workers=DRIVE_COPY_MAX_WORKERS, thread_name_prefix="drive-copy")
+def invalidate_template_caches():
+    template_layout_cache.invalidate()
+    chart_id_cache.invalidate(SOURCE_SHEET_ID)
+
+# Pooled copies must match the layout and chart IDs requests are built from, so a template edit drops all of them
+template_pool = TemplatePool(SOURCE_FILE_ID, SOURCE_SHEET_ID, SHARED_FOLDER_ID, on_template_change=invalidate_template_caches)
 
 def is_simple_emoji(grapheme):
     return any(unicodedata.category(char) in ['So', 'Sk'] or ord(char) > 10000 for char in grapheme)
@@ -157,234 +159,10 @@ def get_content_to_replace_in_slides(cohort_name, llm_response_json, audience_fo
 
     return data, persona_data
 
-def update_slides_content(copied_file_id, data):
-    requests = []
-    presentation = slides_service.presentations().get(presentationId=copied_file_id).execute()
-    
-    for slide in presentation['slides']:
-        for element in slide.get('pageElements', []):
-            if 'shape' in element:
-                alt_text = element.get('description', '')
-                if alt_text in data:
-                    object_id = element['objectId']
-                    shape = element['shape']
-                    text_elements = shape.get('text', {}).get('textElements', [])
-                    
-                    if not text_elements:
-                        continue
-                    
-                    # Extract original styles line by line
-                    lines = []
-                    current_line = ""
-                    current_style = None
-                    index = 0
-
-                    for elem in text_elements:
-                        if 'textRun' in elem:
-                            content = elem['textRun'].get('content', '')
-                            style = elem['textRun'].get('style', {})
-                            for char in content:
-                                if char == '\n':
-                                    lines.append((current_line, current_style))
-                                    current_line = ""
-                                else:
-                                    if current_line == "":
-                                        current_style = style
-                                    current_line += char
-                        elif 'paragraphMarker' in elem:
-                            if current_line:
-                                lines.append((current_line, current_style))
-                                current_line = ""
-
-                    if current_line:
-                        lines.append((current_line, current_style))
-
-                    # Delete existing text
-                    requests.append({
-                        "deleteText": {
-                            "objectId": object_id,
-                            "textRange": {"type": "ALL"}
-                        }
-                    })
-
-                    # Insert new text
-                    new_text = str(data[alt_text])  # should include `\n` if multi-line
-                    requests.append({
-                        "insertText": {
-                            "objectId": object_id,
-                            "insertionIndex": 0,
-                            "text": new_text
-                        }
-                    })
-
-                    # Reapply text styles per line
-                    char_index = 0
-                    new_lines = new_text.split('\n')
-
-                    for i, line_text in enumerate(new_lines):
-                        if i < len(lines):
-                            _, line_style = lines[i]
-                            if line_style and len(line_text) > 0:
-                                requests.append({
-                                    "updateTextStyle": {
-                                        "objectId": object_id,
-                                        "style": line_style,
-                                        "textRange": {
-                                            "type": "FIXED_RANGE",
-                                            "startIndex": char_index,
-                                            "endIndex": char_index + len(line_text)+1
-                                        },
-                                        "fields": ",".join(line_style.keys())
-                                    }
-                                })
-                        char_index += len(line_text) + 1  # account for `\n`
-
-                    # Reapply paragraph style (alignment)
-                    for elem in text_elements:
-                        if 'paragraphMarker' in elem and 'style' in elem['paragraphMarker']:
-                            para_style = elem['paragraphMarker']['style']
-                            requests.append({
-                                "updateParagraphStyle": {
-                                    "objectId": object_id,
-                                    "style": para_style,
-                                    "textRange": {"type": "ALL"},
-                                    "fields": ",".join(para_style.keys())
-                                }
-                            })
-                            break  # Only need first one
-
-    return requests
-
-
-def replace_table_cell_text(table_element, table_object_id, row_index, col_index, new_text):
-
-    cell = table_element["tableRows"][row_index]["tableCells"][col_index]
-    text_elements = cell.get("text", {}).get("textElements", [])
-
-    # Estimate endIndex for deleteText
-    end_index = 0
-    for el in text_elements:
-        end_index = max(end_index, el.get("endIndex", 0))
-
-    requests = []
-
-    if end_index > 0:
-        requests.append({
-            "deleteText": {
-                "objectId": table_object_id,
-                "cellLocation": {
-                    "rowIndex": row_index,
-                    "columnIndex": col_index
-                },
-                "textRange": {
-                    "type": "FIXED_RANGE",
-                    "startIndex": 0,
-                    "endIndex": end_index-1
-                }
-            }
-        })
-    # Step 2: Insert new text at index 0
-    requests.append({
-        "insertText": {
-            "objectId": table_object_id,
-            "cellLocation": {
-                "rowIndex": row_index,
-                "columnIndex": col_index
-            },
-            "insertionIndex": 0,
-            "text": new_text
-        }
-    })
-    return requests
-
-def update_requests_for_tablular_data_in_slides(presentation_id, data_rows, table_alt_text):
-    requests = []
-
-    # Get the presentation
-    presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
-
-    for slide in presentation['slides']:
-        for element in slide.get('pageElements', []):
-            if element.get('description') == table_alt_text and 'table' in element:
-                logger.info(f"Found table with alt_text: {table_alt_text}")
-                table = element['table']
-                object_id = element['objectId']
-                for row in range(len(data_rows)):
-                    for col in range(len(data_rows[row])):
-                        requests.extend(replace_table_cell_text(table, object_id, row+1, col, data_rows[row][col]))
-
-    return requests
-
-def get_tabular_data_for_forecast_tables(preset_name, audience_forecast):
-    
-    city_groups = ["Tier1 Cities", "Tier2 Cities", "Tier3", "Top 8 Metro Cities", "Top 10 Cities"]
-    states = ["Maharashtra", "Karnataka", "Telangana", "Tamil Nadu", "Andhra Pradesh"]
-    cities = ["Bengaluru", "Delhi", "Mumbai", "Pune", "Hyderabad", "Nagpur", "Ahmedabad", "Vadodara", "Jaipur", "Chandigarh", "Indore","Lucknow","Kolkata","Chennai","Coimbatore","Kochi"]
-    countries = ["India", "United States", "GCC", "Canada", "United Arab Emirates"]
-    
-    forecast_data = audience_forecast[preset_name]
-    
-    country_tier_state_data = []
-    
-    country_tier_state_data.append(["Countries", "", ""])
-    for country in countries:
-        entry = forecast_data.get(country)
-        if entry:
-            fcap_1 = round(entry["user"], 2)
-            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
-            country_tier_state_data.append([country, str(fcap_1), str(fcap_3)])
-            
-    country_tier_state_data.append(["Geographic Tiers", "", ""])
-    for city_group in city_groups:
-        entry = forecast_data.get(city_group)
-        if entry:
-            fcap_1 = round(entry["user"], 2)
-            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
-            country_tier_state_data.append([city_group, str(fcap_1), str(fcap_3)])
-            
-    country_tier_state_data.append(["State", "", ""])
-    for state in states:
-        entry = forecast_data.get(state)
-        if entry:
-            fcap_1 = round(entry["user"], 2)
-            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
-            country_tier_state_data.append([state, str(fcap_1), str(fcap_3)])
-            
-    city_data = []
-            
-    city_data.append(["Cities", "", ""])
-    for city in cities:
-        entry = forecast_data.get(city)
-        if entry:
-            fcap_1 = round(entry["user"], 2)
-            fcap_3 = round(min(fcap_1 * 3, entry["impr"]), 2)
-            city_data.append([city, str(fcap_1), str(fcap_3)])
-            
-    return country_tier_state_data, city_data
-
-def get_update_requests_for_numerical_data_in_slides(presentation_id, audience_forecast):
-    final_requests = []
-    preset_alt_mapping={
-        "TIL_All_Cluster_RNF": "cluster",
-        "TIL_All_Languages_RNF": "language",
-        "TIL_TOI_Only_RNF": "TOI",
-        "TIL_ET_Only_RNF": "ET",
-        "TIL_ET_And_TOI_RNF": "combo",
-        "TIL_NBT_Only_RNF": "NBT",
-    }
-    for preset in ["TIL_All_Cluster_RNF", "TIL_All_Languages_RNF", "TIL_TOI_Only_RNF", "TIL_ET_Only_RNF", "TIL_ET_And_TOI_RNF", "TIL_NBT_Only_RNF"]:
-        country_tier_state_data, city_data= get_tabular_data_for_forecast_tables(preset, audience_forecast)
-        country_tier_state_requests = update_requests_for_tablular_data_in_slides(presentation_id, country_tier_state_data, f"{preset_alt_mapping[preset]}_country_tier_state")
-        city_requests = update_requests_for_tablular_data_in_slides(presentation_id, city_data, f"{preset_alt_mapping[preset]}_city")
-        final_requests.extend(country_tier_state_requests + city_requests)
-    return final_requests
-
-def delete_slides_requests(presentation_id, persona_slide_index):
+def delete_slides_requests(snapshot, persona_slide_index):
     requests = []
     slide_indexes_to_delete = [2, 3, persona_slide_index]
-    presentation = slides_service.presentations().get(presentationId=presentation_id).execute()
-    slides = presentation['slides']
-    for idx, slide in enumerate(slides):
+    for idx, slide in enumerate(snapshot.slides):
         if idx in slide_indexes_to_delete:
             slide_id = slide['objectId']
             requests.append({
@@ -400,39 +178,106 @@ def get_persona_slide_index(data):
             break
     return (PERSONA_SLIDE_INDEX_4, PERSONA_SLIDE_INDEX_6) if desired_count == 4 else (PERSONA_SLIDE_INDEX_6, PERSONA_SLIDE_INDEX_4)
 
-def get_copy_of_presentation(cohort_name, llm_response_json, audience_forecast):
-    copied_file = drive_service.files().copy(
-        fileId=SOURCE_FILE_ID,
-        body={
-            'name': f'TIL_CohortDashboard_{"".join(cohort_name.split(" "))}_Forecast_{datetime.now().strftime("%B%Y")}',
-            'parents': [SHARED_FOLDER_ID]
-        }
-    ).execute()
-    sheet_copy = drive_service.files().copy(
-        fileId=SOURCE_SHEET_ID,
+def completed_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def copy_drive_file(file_id, name):
+    """Copy a Drive file into the shared folder and return the copy's ID"""
+    copied = get_drive_service().files().copy(
+        fileId=file_id,
         body={
-            'name': f'Charts_{"".join(cohort_name.split(" "))}_{datetime.now().strftime("%B%Y")}',
+            'name': name,
             'parents': [SHARED_FOLDER_ID]
-        }
+        },
+        fields='id'
     ).execute()
-    logger.info(f"Copy created: https://drive.google.com/file/d/{copied_file['id']}")
-    copied_file_id = copied_file['id']
-    copied_sheet_id = sheet_copy['id']
-    data, persona_data = get_content_to_replace_in_slides(cohort_name, llm_response_json, audience_forecast)
-    persona_slide_index_to_keep, persona_slide_index_to_discard = get_persona_slide_index(persona_data)
-    update_persona_content(slides_service, copied_file_id, persona_slide_index_to_keep, persona_data)
-    delete_requests = delete_slides_requests(copied_file_id, persona_slide_index_to_discard)
-    update_requests = update_slides_content(copied_file_id, data)
-    update_requests_numerical = get_update_requests_for_numerical_data_in_slides(copied_file_id, audience_forecast)
-    update_charts_in_slides(copied_file_id, slides_service, copied_sheet_id, sheets_service, CHART_SLIDE_INDEX, None)
-    final_requests = update_requests + update_requests_numerical + delete_requests
-    if final_requests:
-        slides_service.presentations().batchUpdate(
-            presentationId=copied_file_id,
-            body={"requests": final_requests}
-        ).execute()
-        logger.info("Text and paragraph formatting updated successfully.")
+    return copied['id']
+
+def delete_drive_files(file_ids):
+    """Delete Drive files, logging instead of raising so cleanup never hides the original error"""
+    drive_service = get_drive_service()
+    for file_id in file_ids:
+        try:
+            drive_service.files().delete(fileId=file_id).execute()
+            logger.info(f"Deleted Drive file {file_id}")
+        except Exception as e:
+            logger.warning(f"Could not delete Drive file {file_id}: {e}")
+
+def get_copy_of_presentation(cohort_name, llm_response_json, audience_forecast, template_snapshot=None, stage_callback=None, copies_callback=None):
+    """
+    Copy the template deck and sheet for a cohort and fill them in. stage_callback, if
+    given, is called with the name of each stage as it completes, and copies_callback
+    with the deck and sheet IDs as soon as the copies exist.
+
+    A ready pair from the template pool is claimed when there is one. Otherwise both
+    Drive copies run concurrently, and with the template layout cache enabled the
+    requests are built from the template's layout while the copies are in flight.
+    """
+    def report_stage(stage):
+        if stage_callback:
+            stage_callback(stage)
+
+    slides_service = get_slides_service()
+    sheets_service = get_sheets_service()
+    compact_name = "".join(cohort_name.split(" "))
+    month = datetime.now().strftime("%B%Y")
+    deck_name = f'TIL_CohortDashboard_{compact_name}_Forecast_{month}'
+    sheet_name = f'Charts_{compact_name}_{month}'
+    pooled_pair = template_pool.claim(deck_name, sheet_name)
+    if pooled_pair:
+        deck_copy, sheet_copy = (completed_future(file_id) for file_id in pooled_pair)
+    else:
+        deck_copy = drive_copy_executor.submit(copy_drive_file, SOURCE_FILE_ID, deck_name)
+        sheet_copy = drive_copy_executor.submit(copy_drive_file, SOURCE_SHEET_ID, sheet_name)
+    try:
+        data, persona_data = get_content_to_replace_in_slides(cohort_name, llm_response_json, audience_forecast)
+        persona_slide_index_to_keep, persona_slide_index_to_discard = get_persona_slide_index(persona_data)
+        # One layout shared by every request builder below: the cached template's, or one read of the copy.
+        # Drive copies keep object IDs, so requests built from the template apply to the copy.
+        if TEMPLATE_LAYOUT_CACHE_ENABLED:
+            layout = template_snapshot or template_layout_cache.get(slides_service)
+        else:
+            layout = PresentationSnapshot(slides_service, deck_copy.result(), PRESENTATION_FIELDS)
+        persona_requests = update_persona_content(layout, persona_slide_index_to_keep, persona_data)
+        report_stage("persona_requests_built")
+        text_requests = update_slides_content(layout, data)
+        table_requests = get_update_requests_for_numerical_data_in_slides(layout, audience_forecast)
+        delete_requests = delete_slides_requests(layout, persona_slide_index_to_discard)
+        report_stage("content_requests_built")
+        copied_file_id = deck_copy.result()
+        copied_sheet_id = sheet_copy.result()
+    except BaseException:
+        # cancel() only stops copies that have not started; wait for the rest and delete
+        # what they made, pooled pairs included, so no unfilled deck is left in the folder
+        created = []
+        for copy in (deck_copy, sheet_copy):
+            if copy.cancel():
+                continue
+            try:
+                created.append(copy.result())
+            except Exception:
+                pass
+        delete_drive_files(created)
+        raise
+    logger.info(f"Copy created: https://drive.google.com/file/d/{copied_file_id}")
+    if copies_callback:
+        copies_callback(copied_file_id, copied_sheet_id)
+    report_stage("copied")
+    snapshot = layout.for_copy(copied_file_id, slides_service) if TEMPLATE_LAYOUT_CACHE_ENABLED else layout
+
+    # Every request is built against the same layout and written together at the end
+    planner = SlidesWritePlanner(copied_file_id)
+    planner.add(PERSONAS, persona_requests)
+    planner.add(TEXT, text_requests)
+    planner.add(TABLES, table_requests)
+    planner.add(DELETIONS, delete_requests)
+    planner.add(CHARTS, update_charts_in_slides(snapshot, copied_sheet_id, sheets_service, CHART_SLIDE_INDEX, None, template_sheet_id=SOURCE_SHEET_ID))
+    report_stage("chart_requests_built")
+    if planner.requests():
+        planner.execute(slides_service, snapshot)
     else:
         logger.info("No matching alt_text found.")
+    report_stage("content_applied")
     return f"https://drive.google.com/file/d/{copied_file_id}"
-    
\ No newline at end of file
@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import httplib2
+import pytest
+
+from genai_mediaplan.utils import google_clients, google_rate_limit
+from genai_mediaplan.utils.google_rate_limit import RateLimitedHttpRequest
+
+THREADS = 16
+CALLS_PER_THREAD = 5
+
+
+class ThreadBoundHttp:
+    """Fake httplib2.Http that records every request and the threads it was used from"""
+
+    def __init__(self, credentials, http=None):
+        self.owner = threading.get_ident()
+        self.used_from = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with self._lock:
+            self.used_from.add(threading.get_ident())
+            self.requests += 1
+        return httplib2.Response({"status": "200"}), b"{}"
+
+
+@pytest.fixture
+def fake_google(monkeypatch):
+    monkeypatch.setattr(google_clients, "_credentials", object())
+    monkeypatch.setattr(google_clients, "_thread_clients", threading.local())
+    monkeypatch.setattr(google_clients, "AuthorizedHttp", ThreadBoundHttp)
+    # No rate limiting, so the threads hit the clients at the same time
+    monkeypatch.setattr(google_rate_limit, "buckets", {})
+
+
+def use_clients(barrier):
+    barrier.wait()
+    drive = google_clients.get_drive_service()
+    slides = google_clients.get_slides_service()
+    sheets = google_clients.get_sheets_service()
+    built = []
+    for _ in range(CALLS_PER_THREAD):
+        calls = [
+            drive.files().get(fileId="file", fields="id"),
+            slides.presentations().get(presentationId="deck"),
+            sheets.spreadsheets().get(spreadsheetId="sheet"),
+            slides.presentations().batchUpdate(presentationId="deck", body={"requests": []}),
+        ]
+        for request in calls:
+            request.execute()
+        built.extend(calls)
+    # The same thread gets the same clients back
+    assert google_clients.get_drive_service() is drive
+    assert google_clients.get_slides_service() is slides
+    assert google_clients.get_sheets_service() is sheets
+    return threading.get_ident(), google_clients.get_authorized_http(), (drive, slides, sheets), built
+
+
+def test_clients_and_connections_are_never_shared_across_threads(fake_google):
+    barrier = threading.Barrier(THREADS)
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(lambda _: use_clients(barrier), range(THREADS)))
+
+    https = [http for _, http, _, _ in results]
+    services = [service for _, _, thread_services, _ in results for service in thread_services]
+    assert len({id(http) for http in https}) == THREADS
+    assert len({id(service) for service in services}) == THREADS * 3
+
+    for thread_id, http, thread_services, built in results:
+        # Each connection was created by, and only used from, its own thread
+        assert http.owner == thread_id
+        assert http.used_from == {thread_id}
+        assert http.requests == CALLS_PER_THREAD * 4
+        assert all(service._http is http for service in thread_services)
+        assert all(isinstance(request, RateLimitedHttpRequest) for request in built)
+        assert all(request.http is http for request in built)